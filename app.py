@@ -1,70 +1,217 @@
 # app.py
+import hashlib
+import json
 import os
-import sqlite3
-from flask import Flask, render_template, request, g, redirect, url_for, send_file
+import shutil
+import threading
+from flask import Flask, Response, render_template, request, g, redirect, url_for, send_file, jsonify
 from datetime import datetime
 from werkzeug.utils import secure_filename
-from evaluator import evaluate_pdfs
-from utils import extract_max_marks
+from evaluator import embedding_cache, encode_batcher, evaluate_pdfs, load_model_answers, score_scripts, warm_up
+from scoring import grade_result, parse_choice_rule
+from utils import extract_max_marks, extract_answers, extract_text_from_handwritten_pdf, ocr_cache, gemini_client, page_source_stats
+from jobs import JobQueue, start_workers
+from cache import ExportCache
+from database import DATABASE, create_tables, data_version, get_connection, release_connection, migrate
+from exports import EXPORT_FORMATS, export_report
+from persistence import delete_student_records, record_evaluation, save_evaluation
+from regrade import regrade_from_pdfs
+from metrics import ocr_page_seconds, record_stages, render_value, span, stage_seconds
+from batching import encode_batch_texts, encode_queue_seconds
+from report_queries import (decode_cursor, evaluation_history, report_options, student_gpas, subject_stats,
+                            HISTORY_SORTS)
 import pandas as pd
 import io
-from collections import defaultdict
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = "uploads"
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
+app.config['MAX_CONTENT_LENGTH'] = 256 * 1024 * 1024  # 256MB, room for class-wide ZIP uploads
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-DATABASE = 'evaluations.db'
+# Number of background threads that run queued evaluations
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# Load the embedding model in the background as soon as workers start
+WARM_UP_MODEL = os.environ.get("WARM_UP_MODEL", "1") == "1"
+
+# Student scripts OCR'd concurrently, and scripts scored/written per transaction, in bulk mode
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", "4"))
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", "25"))
+
+job_queue = JobQueue(DATABASE)
+export_cache = ExportCache()
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
 def get_db():
+    """The current thread's tuned connection, reused across requests and jobs on that thread"""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = g._database = get_connection(DATABASE)
     return db
 
 def init_db():
     with app.app_context():
         db = get_db()
-        db.execute('''CREATE TABLE IF NOT EXISTS evaluations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            roll_no TEXT NOT NULL,
-            subject TEXT NOT NULL,
-            timestamp TEXT,
-            total_marks REAL,
-            percentage REAL,
-            grade TEXT,
-            grade_point REAL,
-            student_pdf_path TEXT,
-            model_pdf_path TEXT,
-            question_pdf_path TEXT,
-            credits INTEGER DEFAULT 3)''')
-
-        db.execute('''CREATE TABLE IF NOT EXISTS students (
-            roll_no TEXT PRIMARY KEY,
-            full_name TEXT,
-            department TEXT)''')
-
-        db.execute('''CREATE TABLE IF NOT EXISTS question_results (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            evaluation_id INTEGER,
-            question TEXT,
-            student_answer TEXT,
-            model_answer TEXT,
-            similarity REAL,
-            score REAL,
-            max_marks REAL,
-            FOREIGN KEY(evaluation_id) REFERENCES evaluations(id))''')
-        
-        db.commit()
+        create_tables(db)
+        migrate(db)
 
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+    # The connection stays open for the thread's next request; only discard unfinished work
+    if getattr(g, '_database', None) is not None:
+        release_connection(DATABASE)
+
+def run_evaluation(payload, report_progress):
+    """Grade one submission; runs on a background job worker"""
+    roll_no = payload['roll_no']
+    subject = payload['subject']
+    paths = payload['paths']
+
+    # Stage timings are stored with the evaluation; the write itself only reaches /metrics
+    with record_stages() as stage_timings, span("evaluation"):
+        report_progress('extracting marks', 10)
+        max_marks = extract_max_marks(paths['question_pdf'])
+        if not max_marks:
+            raise ValueError("Could not extract marks from question paper!")
+
+        report_progress('evaluating answers', 30)
+        results, total_marks = evaluate_pdfs(
+            student_pdf=paths['student_pdf'],
+            model_pdf=paths['model_pdf'],
+            max_marks=max_marks,
+            choice_rule=payload.get('choice_rule')
+        )
+        percentage, grade, grade_point = grade_result(total_marks, max_marks, payload.get('choice_rule'))
+
+    report_progress('saving results', 90)
+    with app.app_context(), span("db_write"):
+        db = get_db()
+        record_evaluation(db, {
+            "roll_no": roll_no,
+            "full_name": payload['full_name'],
+            "subject": subject,
+            "credits": payload['credits'],
+            "total_marks": total_marks,
+            "percentage": percentage,
+            "grade": grade,
+            "grade_point": grade_point,
+            "student_pdf": paths['student_pdf'],
+            "model_pdf": paths['model_pdf'],
+            "question_pdf": paths['question_pdf'],
+            "choice_rule": payload.get('choice_rule'),
+            "stage_timings": stage_timings
+        }, results)
+
+    return {
+        "roll_no": roll_no,
+        "subject": subject,
+        "total_marks": total_marks,
+        "percentage": round(percentage, 2),
+        "grade": grade,
+        "grade_point": grade_point,
+        "evaluation_date": datetime.now().strftime("%d %b %Y %H:%M"),
+        "question_results": results
+    }
+
+def roll_no_from_filename(path):
+    """'21VV1A0529_Lasya.pdf' -> ('21VV1A0529', 'Lasya'); the name part is optional"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    roll_no, _, name = stem.partition('_')
+    return roll_no.strip(), name.replace('_', ' ').strip() or None
+
+def run_bulk_evaluation(payload, report_progress):
+    """Grade a whole section against one question paper and model answer"""
+    subject = payload['subject']
+    student_pdfs = payload['student_pdfs']
+
+    report_progress('extracting marks', 5)
+    max_marks = extract_max_marks(payload['question_pdf'])
+    if not max_marks:
+        raise ValueError("Could not extract marks from question paper!")
+
+    report_progress('reading model answers', 10)
+    model_answers = load_model_answers(payload['model_pdf'])
+
+    summary = []
+    errors = []
+    pending = []
+
+    def flush():
+        # Score the pending scripts in one batched pass and write them in one transaction
+        scored = score_scripts([answers for _, answers, _ in pending], model_answers, max_marks,
+                               payload.get('choice_rule'))
+        with app.app_context(), span("db_write"):
+            db = get_db()
+            for (student_pdf, _, stage_timings), (results, total_marks) in zip(pending, scored):
+                roll_no, full_name = roll_no_from_filename(student_pdf)
+                percentage, grade, grade_point = grade_result(total_marks, max_marks, payload.get('choice_rule'))
+                save_evaluation(db, {
+                    "roll_no": roll_no,
+                    "full_name": full_name,
+                    "subject": subject,
+                    "credits": payload['credits'],
+                    "total_marks": total_marks,
+                    "percentage": percentage,
+                    "grade": grade,
+                    "grade_point": grade_point,
+                    "student_pdf": student_pdf,
+                    "model_pdf": payload['model_pdf'],
+                    "question_pdf": payload['question_pdf'],
+                    "choice_rule": payload.get('choice_rule'),
+                    "stage_timings": stage_timings
+                }, results)
+                summary.append({
+                    "roll_no": roll_no,
+                    "total_marks": total_marks,
+                    "percentage": round(percentage, 2),
+                    "grade": grade,
+                    "grade_point": grade_point
+                })
+            db.commit()
+        pending.clear()
+
+    def read_script(student_pdf):
+        # Batched scoring is shared by the chunk, so only a script's own reading time is stored with it
+        with record_stages() as stage_timings:
+            answers = extract_answers(extract_text_from_handwritten_pdf(student_pdf))
+        return answers, stage_timings
+
+    with ThreadPoolExecutor(max_workers=BULK_WORKERS) as executor:
+        futures = {executor.submit(read_script, pdf): pdf for pdf in student_pdfs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            student_pdf = futures[future]
+            try:
+                pending.append((student_pdf, *future.result()))
+            except Exception as e:
+                app.logger.error(f"Bulk evaluation error for {student_pdf}: {str(e)}")
+                errors.append({"file": os.path.basename(student_pdf), "error": str(e)})
+            if len(pending) >= BULK_CHUNK_SIZE:
+                flush()
+            report_progress(f'graded {done} of {len(student_pdfs)} scripts', 10 + int(85 * done / len(student_pdfs)))
+    if pending:
+        flush()
+
+    summary.sort(key=lambda row: row['roll_no'])
+    return {"subject": subject, "students": summary, "errors": errors}
+
+def run_regrade(payload, report_progress):
+    """Re-score a subject's stored answers against a corrected question paper and/or model answer"""
+    report_progress('re-grading stored answers', 10)
+    with app.app_context(), span("regrade"):
+        return regrade_from_pdfs(get_db(), payload['subject'], payload.get('question_pdf'),
+                                 payload.get('model_pdf'), payload.get('choice_rule'))
+
+JOB_HANDLERS = {'evaluation': run_evaluation, 'bulk_evaluation': run_bulk_evaluation, 'regrade': run_regrade}
+JOB_RESULT_TEMPLATES = {'evaluation': 'result.html', 'bulk_evaluation': 'bulk_result.html',
+                        'regrade': 'regrade_result.html'}
+
+def start_job_workers(count=JOB_WORKERS):
+    if WARM_UP_MODEL:
+        threading.Thread(target=warm_up, name="model-warm-up", daemon=True).start()
+    return start_workers(job_queue, JOB_HANDLERS, count)
 
 @app.route("/", methods=["GET", "POST"])
 def index():
@@ -74,9 +221,14 @@ def index():
             subject = request.form.get('subject').strip()
             credits = int(request.form.get('credits', 3))
             full_name = request.form.get('full_name').strip()
+            choice_rule = request.form.get('choice_rule', '').strip()
 
             if not roll_no or not subject:
                 return render_template("index.html", error="Roll number and subject are required!")
+            try:
+                parse_choice_rule(choice_rule)
+            except ValueError as e:
+                return render_template("index.html", error=str(e))
             if any(f not in request.files for f in ["student_pdf", "model_pdf", "question_pdf"]):
                 return render_template("index.html", error="Missing file uploads!")
 
@@ -90,66 +242,18 @@ def index():
                 file.save(filepath)
                 paths[file_type] = filepath
 
-            max_marks = extract_max_marks(paths['question_pdf'])
-            if not max_marks:
-                return render_template("index.html", error="Could not extract marks from question paper!")
-
-            results, total_marks = evaluate_pdfs(
-                student_pdf=paths['student_pdf'],
-                model_pdf=paths['model_pdf'],
-                max_marks=max_marks
-            )
-
-            total_max_marks = sum(max_marks.values())/2
-            percentage = (total_marks / total_max_marks * 100) if total_max_marks else 0
-
-            if percentage >= 90:
-                grade, grade_point = 'O', 10.0
-            elif percentage >= 80:
-                grade, grade_point = 'A+', 9.0
-            elif percentage >= 70:
-                grade, grade_point = 'A', 8.0
-            elif percentage >= 60:
-                grade, grade_point = 'B+', 7.0
-            elif percentage >= 50:
-                grade, grade_point = 'B', 6.0
-            elif percentage >= 40:
-                grade, grade_point = 'C', 5.0
-            else:
-                grade, grade_point = 'F', 0.0
-
-            db = get_db()
-            db.execute('INSERT OR REPLACE INTO students (roll_no, full_name) VALUES (?, ?)', (roll_no, full_name))
-
-            db.execute('DELETE FROM evaluations WHERE roll_no = ? AND subject = ?', (roll_no, subject))
-
-            eval_id = db.execute('''INSERT INTO evaluations (
-                roll_no, subject, timestamp, total_marks, percentage, grade, grade_point,
-                student_pdf_path, model_pdf_path, question_pdf_path, credits)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                (roll_no, subject, datetime.now().isoformat(), total_marks, percentage,
-                 grade, grade_point, paths['student_pdf'], paths['model_pdf'], paths['question_pdf'], credits)).lastrowid
-
-            for result in results:
-                db.execute('''INSERT INTO question_results (
-                    evaluation_id, question, student_answer, model_answer,
-                    similarity, score, max_marks)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                    (eval_id, result["question"], result["student_answer"],
-                     result["model_answer"], result["similarity"],
-                     result["score"], result["max_marks"]))
-
-            db.commit()
+            job_id = job_queue.enqueue('evaluation', {
+                "roll_no": roll_no,
+                "subject": subject,
+                "credits": credits,
+                "full_name": full_name,
+                "choice_rule": choice_rule,
+                "paths": paths
+            })
 
-            return render_template("result.html",
-                roll_no=roll_no,
-                subject=subject,
-                total_marks=total_marks,
-                percentage=round(percentage, 2),
-                grade=grade,
-                grade_point=grade_point,
-                evaluation_date=datetime.now().strftime("%d %b %Y %H:%M"),
-                question_results=results)
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({"job_id": job_id, "status_url": url_for('job_status', job_id=job_id)}), 202
+            return redirect(url_for('job_page', job_id=job_id))
 
         except Exception as e:
             app.logger.error(f"Evaluation error: {str(e)}")
@@ -157,53 +261,213 @@ def index():
 
     return render_template("index.html")
 
+@app.route("/jobs/<int:job_id>")
+def job_page(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return render_template("error.html", message="Evaluation job not found"), 404
+    return render_template("job.html", job=job)
+
+@app.route("/jobs/<int:job_id>/status")
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({
+        "id": job['id'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "progress": job['progress'],
+        "error": job['error'],
+        "result_url": url_for('job_result', job_id=job_id) if job['status'] == 'done' else None
+    })
+
+@app.route("/jobs/<int:job_id>/result")
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return render_template("error.html", message="Evaluation job not found"), 404
+    if job['status'] == 'failed':
+        return render_template("error.html", message=f"Evaluation failed: {job['error']}")
+    if job['status'] != 'done':
+        return redirect(url_for('job_page', job_id=job_id))
+    return render_template(JOB_RESULT_TEMPLATES[job['kind']], **job['result'])
+
+def save_upload(file, filename):
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
+    file.save(filepath)
+    return filepath
+
+def unpack_student_scripts(folder):
+    """Collect student PDFs from an uploaded ZIP and/or multi-file (folder) upload.
+
+    Raises ValueError when two scripts have the same roll number, e.g. the
+    same file name in two folders of the ZIP, rather than keeping only one.
+    """
+    os.makedirs(folder, exist_ok=True)
+    student_pdfs = []
+    sources = {}
+
+    def claim(name, source):
+        roll_no, _ = roll_no_from_filename(name)
+        if roll_no in sources:
+            raise ValueError(f"Roll number {roll_no} appears twice in the upload ({sources[roll_no]} and {source}); "
+                             f"remove or rename one and upload again")
+        sources[roll_no] = source
+        return os.path.join(folder, name)
+
+    archive = request.files.get('students_zip')
+    if archive and archive.filename:
+        with zipfile.ZipFile(archive) as zf:
+            for member in zf.infolist():
+                name = secure_filename(os.path.basename(member.filename))
+                if member.is_dir() or not name.lower().endswith('.pdf'):
+                    continue
+                filepath = claim(name, member.filename)
+                with zf.open(member) as src, open(filepath, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                student_pdfs.append(filepath)
+
+    for file in request.files.getlist('student_pdfs'):
+        name = secure_filename(os.path.basename(file.filename or ''))
+        if name.lower().endswith('.pdf'):
+            filepath = claim(name, file.filename)
+            file.save(filepath)
+            student_pdfs.append(filepath)
+
+    return sorted(student_pdfs)
+
+@app.route("/bulk", methods=["GET", "POST"])
+def bulk():
+    if request.method == "POST":
+        try:
+            subject = request.form.get('subject', '').strip()
+            credits = int(request.form.get('credits', 3))
+            choice_rule = request.form.get('choice_rule', '').strip()
+            if not subject:
+                return render_template("bulk.html", error="Subject is required!")
+            try:
+                parse_choice_rule(choice_rule)
+            except ValueError as e:
+                return render_template("bulk.html", error=str(e))
+
+            for file_type in ['model_pdf', 'question_pdf']:
+                if file_type not in request.files or request.files[file_type].filename == '':
+                    return render_template("bulk.html", error="Question paper and model answer are required!")
+
+            stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+            paths = {file_type: save_upload(request.files[file_type], f"bulk_{subject}_{file_type}_{stamp}.pdf")
+                     for file_type in ['model_pdf', 'question_pdf']}
+
+            folder = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(f"bulk_{subject}_{stamp}"))
+            try:
+                student_pdfs = unpack_student_scripts(folder)
+            except ValueError as e:
+                return render_template("bulk.html", error=str(e))
+            if not student_pdfs:
+                return render_template("bulk.html", error="No student PDFs found in the upload!")
+
+            job_id = job_queue.enqueue('bulk_evaluation', {
+                "subject": subject,
+                "credits": credits,
+                "choice_rule": choice_rule,
+                "model_pdf": paths['model_pdf'],
+                "question_pdf": paths['question_pdf'],
+                "student_pdfs": student_pdfs
+            })
+
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({"job_id": job_id, "scripts": len(student_pdfs),
+                                "status_url": url_for('job_status', job_id=job_id)}), 202
+            return redirect(url_for('job_page', job_id=job_id))
+
+        except Exception as e:
+            app.logger.error(f"Bulk evaluation error: {str(e)}")
+            return render_template("bulk.html", error=f"An error occurred: {str(e)}")
+
+    return render_template("bulk.html")
+
+@app.route("/regrade", methods=["GET", "POST"])
+def regrade():
+    subjects = [row['subject'] for row in get_db().execute('SELECT subject FROM subject_summary ORDER BY subject')]
+    if request.method == "POST":
+        try:
+            subject = request.form.get('subject', '').strip()
+            choice_rule = request.form.get('choice_rule', '').strip()
+            if subject not in subjects:
+                return render_template("regrade.html", subjects=subjects, error="Choose a subject that has been graded!")
+            try:
+                parse_choice_rule(choice_rule)
+            except ValueError as e:
+                return render_template("regrade.html", subjects=subjects, error=str(e))
+
+            stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+            paths = {file_type: save_upload(request.files[file_type], f"regrade_{subject}_{file_type}_{stamp}.pdf")
+                     for file_type in ['model_pdf', 'question_pdf']
+                     if file_type in request.files and request.files[file_type].filename != ''}
+            if not paths:
+                return render_template("regrade.html", subjects=subjects,
+                                       error="Upload a corrected question paper, model answer, or both!")
+
+            job_id = job_queue.enqueue('regrade', {
+                "subject": subject,
+                "choice_rule": choice_rule,
+                "model_pdf": paths.get('model_pdf'),
+                "question_pdf": paths.get('question_pdf')
+            })
+
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({"job_id": job_id, "status_url": url_for('job_status', job_id=job_id)}), 202
+            return redirect(url_for('job_page', job_id=job_id))
+
+        except Exception as e:
+            app.logger.error(f"Re-grade error: {str(e)}")
+            return render_template("regrade.html", subjects=subjects, error=f"An error occurred: {str(e)}")
+
+    return render_template("regrade.html", subjects=subjects)
+
+def student_semester_gpa(db, roll_no):
+    row = db.execute('SELECT gpa FROM student_summary WHERE roll_no = ?', (roll_no,)).fetchone()
+    return row['gpa'] if row else 0.0
+
 @app.route("/reports")
 def reports():
     try:
         db = get_db()
 
-        results = db.execute('''
-            SELECT e.*, strftime('%d/%m/%Y %H:%M', e.timestamp) as formatted_date, s.full_name
-            FROM evaluations e
-            LEFT JOIN students s ON e.roll_no = s.roll_no
-            ORDER BY e.timestamp DESC
-        ''').fetchall()
+        filters = {
+            "subject": request.args.get('subject', '').strip() or None,
+            "department": request.args.get('department', '').strip() or None,
+            "date_from": request.args.get('date_from', '').strip() or None,
+            "date_to": request.args.get('date_to', '').strip() or None
+        }
+        sort = request.args.get('sort', 'date')
+        if sort not in HISTORY_SORTS:
+            sort = 'date'
+        descending = request.args.get('order', 'desc') != 'asc'
 
-        gpa_data = db.execute('''
-            SELECT e.roll_no, s.full_name,
-                SUM(e.grade_point * e.credits) / SUM(e.credits) as gpa,
-                COUNT(*) as exams_taken
-            FROM evaluations e
-            LEFT JOIN students s ON e.roll_no = s.roll_no
-            GROUP BY e.roll_no
-        ''').fetchall()
-
-        # Check for any failed subjects (grade point 0) and adjust GPA if necessary
-        modified_gpa_data = []
-        for student in gpa_data:
-            evaluations = db.execute('''
-                SELECT grade_point FROM evaluations WHERE roll_no = ?
-            ''', (student['roll_no'],)).fetchall()
-            failed_subjects = any(eval['grade_point'] == 0.0 for eval in evaluations)
-            if failed_subjects:
-                modified_gpa_data.append({**dict(student), 'gpa': 0.0})
-            else:
-                modified_gpa_data.append(dict(student))
-
-        subject_stats = db.execute('''
-            SELECT subject,
-                AVG(percentage) as avg_percentage,
-                COUNT(*) as exams_graded,
-                AVG(grade_point) as avg_grade_point,
-                credits
-            FROM evaluations
-            GROUP BY subject
-        ''').fetchall()
+        try:
+            gpa_data, next_students = student_gpas(
+                db, department=filters['department'], after=decode_cursor(request.args.get('students_after'), 1))
+            results, next_results = evaluation_history(
+                db, filters, sort=sort, descending=descending, after=decode_cursor(request.args.get('after'), 2))
+        except ValueError as e:
+            return render_template("error.html", message=str(e)), 400
+
+        subjects, departments = report_options(db)
 
         return render_template("reports.html",
             results=results,
-            gpa_data=modified_gpa_data,
-            subject_stats=subject_stats)
+            gpa_data=gpa_data,
+            subject_stats=subject_stats(db, filters),
+            filters=filters,
+            sort=sort,
+            order='desc' if descending else 'asc',
+            sorts=list(HISTORY_SORTS),
+            subjects=subjects,
+            departments=departments,
+            next_results=next_results,
+            next_students=next_students)
 
     except Exception as e:
         app.logger.error(f"Reports error: {str(e)}")
@@ -234,36 +498,17 @@ def student_report(roll_no):
             ORDER BY e.timestamp DESC
         ''', (roll_no,)).fetchall()
 
+        # Evaluations are unique per subject, so each row is the latest for its subject
         subject_performance = db.execute('''
             SELECT e.subject,
                 e.percentage as avg_percentage,
                 e.grade_point as avg_grade_point,
                 e.credits
             FROM evaluations e
-            INNER JOIN (
-                SELECT subject, MAX(timestamp) as latest_time
-                FROM evaluations
-                WHERE roll_no = ?
-                GROUP BY subject
-            ) latest_eval
-            ON e.subject = latest_eval.subject AND e.timestamp = latest_eval.latest_time
             WHERE e.roll_no = ?
-        ''', (roll_no, roll_no)).fetchall()
-
-        if subject_performance:
-            total_credits = sum(row['credits'] for row in subject_performance)
-            weighted_gpa = sum(row['avg_grade_point'] * row['credits'] for row in subject_performance)
-
-            # Check for any failed subjects (grade point 0)
-            failed_subjects = any(row['avg_grade_point'] == 0.0 for row in subject_performance)
-            if failed_subjects:
-                semester_gpa = 0.0  # Semester GPA is 0 if any subject is failed
-            elif total_credits > 0:
-                semester_gpa = weighted_gpa / total_credits
-            else:
-                semester_gpa = 0.0
-        else:
-            semester_gpa = 0.0
+        ''', (roll_no,)).fetchall()
+
+        semester_gpa = student_semester_gpa(db, roll_no)
 
         return render_template("student_report.html",
             roll_no=roll_no,
@@ -276,68 +521,60 @@ def student_report(roll_no):
         app.logger.error(f"Student report error: {str(e)}")
         return render_template("error.html", message="Could not generate student report")
 
+def export_key(name, *params):
+    """Cache key and ETag for an export: the route, its parameters and the data version"""
+    version, changed_at = data_version(get_db())
+    key = hashlib.sha256(json.dumps([name, list(params), version]).encode("utf-8")).hexdigest()
+    return key, changed_at
+
+def send_export(key, changed_at, path, filename, mimetype):
+    # conditional=True answers If-None-Match / If-Modified-Since with 304
+    return send_file(path, as_attachment=True, download_name=filename, mimetype=mimetype,
+                     etag=key, last_modified=changed_at, conditional=True)
+
+def cached_export(key, changed_at, filename, mimetype):
+    """304 or the cached file for `key`, or None when the export has to be built"""
+    if request.if_none_match.contains_weak(key):
+        response = Response(status=304)
+        response.set_etag(key)
+        response.last_modified = changed_at
+        return response
+    path = export_cache.get(key)
+    if path is None:
+        return None
+    return send_export(key, changed_at, path, filename, mimetype)
+
+def store_export(key, changed_at, output, filename, mimetype):
+    path = export_cache.put(key, [output.getvalue()])
+    return send_export(key, changed_at, path, filename, mimetype)
+
 @app.route("/download_excel")
 def download_excel():
-    db = get_db()
-
-    rows = db.execute('''
-        SELECT e.roll_no, s.full_name, e.subject, e.grade, e.grade_point, e.credits
-        FROM evaluations e
-        LEFT JOIN students s ON e.roll_no = s.roll_no
-        INNER JOIN (
-            SELECT roll_no, subject, MAX(timestamp) as latest_time
-            FROM evaluations
-            GROUP BY roll_no, subject
-        ) latest
-        ON e.roll_no = latest.roll_no AND e.subject = latest.subject AND e.timestamp = latest.latest_time
-    ''').fetchall()
-
-    student_data = defaultdict(dict)
-    for row in rows:
-        roll = row['roll_no']
-        student_data[roll]["Student Name"] = row['full_name']
-        subject = row['subject']
-        student_data[roll][f"{subject} Grade"] = row['grade']
-        student_data[roll][f"{subject} GPA"] = round(row['grade_point'], 2)
-        student_data[roll][f"{subject} Credits"] = row['credits']
-
-    for roll, subjects in student_data.items():
-        gpa_values = [v for k, v in subjects.items() if "GPA" in k]
-        credit_values = [v for k, v in subjects.items() if "Credits" in k]
-        if gpa_values and credit_values:
-            weighted_sum = sum(gpa_values[i] * credit_values[i] for i in range(len(gpa_values)))
-            total_credits = sum(credit_values)
-            # Check for any failed subjects (grade point 0)
-            failed_subjects = any(gpa == 0.0 for gpa in gpa_values)
-            if failed_subjects:
-                student_data[roll]["Final GPA"] = 0.0
-            elif total_credits > 0:
-                student_data[roll]["Final GPA"] = round(weighted_sum / total_credits, 2)
-            else:
-                student_data[roll]["Final GPA"] = 0.0
-        else:
-            student_data[roll]["Final GPA"] = 0.0
-
-    final_rows = []
-    for roll, data in student_data.items():
-        row = {"Roll No": roll}
-        row.update(data)
-        final_rows.append(row)
-
-    df = pd.DataFrame(final_rows).fillna("")
+    fmt = request.args.get('format', 'xlsx')
+    if fmt not in EXPORT_FORMATS:
+        return render_template("error.html", message=f"Unknown export format {fmt}"), 400
+    filename, mimetype = EXPORT_FORMATS[fmt]
 
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name="Student Report")
-    output.seek(0)
+    key, changed_at = export_key('class_report', fmt)
+    cached = cached_export(key, changed_at, filename, mimetype)
+    if cached is not None:
+        return cached
 
-    return send_file(output,
-        as_attachment=True,
-        download_name="student_performance_report.xlsx",
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    try:
+        # Rows stream from the cursor straight into the cache file
+        path = export_cache.put(key, export_report(get_db(), fmt))
+    except ImportError:
+        return render_template("error.html", message="Parquet export needs the pyarrow package"), 501
+    return send_export(key, changed_at, path, filename, mimetype)
 
 @app.route("/download_student_report/<roll_no>/<subject>")
 def download_student_report(roll_no, subject):
+    filename = f"{roll_no}_{subject}_report.xlsx"
+    key, changed_at = export_key('student_report', roll_no, subject)
+    cached = cached_export(key, changed_at, filename, XLSX_MIMETYPE)
+    if cached is not None:
+        return cached
+
     db = get_db()
     eval_data = db.execute('''
         SELECT e.*, s.full_name
@@ -366,15 +603,18 @@ def download_student_report(roll_no, subject):
     output = io.BytesIO()
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
         df.to_excel(writer, index=False, sheet_name="Student Evaluation")
-    output.seek(0)
 
-    filename = f"{roll_no}_{subject}_report.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return store_export(key, changed_at, output, filename, XLSX_MIMETYPE)
 
 @app.route("/download_question_wise/<roll_no>/<subject>")
 def download_question_wise(roll_no, subject):
     try:
+        filename = f"{secure_filename(roll_no)}_{secure_filename(subject)}_question_wise.xlsx"
+        key, changed_at = export_key('question_wise', roll_no, subject)
+        cached = cached_export(key, changed_at, filename, XLSX_MIMETYPE)
+        if cached is not None:
+            return cached
+
         db = get_db()
         eval_data = db.execute('''
             SELECT e.id, s.full_name
@@ -467,13 +707,7 @@ def download_question_wise(roll_no, subject):
             app.logger.error(f"Excel generation error: {str(e)}")
             return render_template("error.html", message=f"Failed to generate Excel file: {str(e)}"), 500
 
-        filename = f"{secure_filename(roll_no)}_{secure_filename(subject)}_question_wise.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        return store_export(key, changed_at, output, filename, XLSX_MIMETYPE)
 
     except Exception as e:
         app.logger.error(f"Question-wise download error: {str(e)}", exc_info=True)
@@ -482,13 +716,7 @@ def download_question_wise(roll_no, subject):
 @app.route("/delete_student/<roll_no>", methods=["POST"])
 def delete_student(roll_no):
     try:
-        db = get_db()
-        eval_ids = [row[0] for row in db.execute("SELECT id FROM evaluations WHERE roll_no = ?", (roll_no,)).fetchall()]
-        for eval_id in eval_ids:
-            db.execute("DELETE FROM question_results WHERE evaluation_id = ?", (eval_id,))
-        db.execute("DELETE FROM evaluations WHERE roll_no = ?", (roll_no,))
-        db.execute("DELETE FROM students WHERE roll_no = ?", (roll_no,))
-        db.commit()
+        delete_student_records(get_db(), roll_no)
         return redirect(url_for('reports'))
     except Exception as e:
         app.logger.error(f"Delete student error: {str(e)}")
@@ -497,6 +725,12 @@ def delete_student(roll_no):
 @app.route("/download_semester_report/<roll_no>")
 def download_semester_report(roll_no):
     try:
+        filename = f"{roll_no}_semester_report.xlsx"
+        key, changed_at = export_key('semester_report', roll_no)
+        cached = cached_export(key, changed_at, filename, XLSX_MIMETYPE)
+        if cached is not None:
+            return cached
+
         db = get_db()
 
         # Get student information
@@ -514,31 +748,14 @@ def download_semester_report(roll_no):
                 e.grade_point as avg_grade_point,
                 e.credits
             FROM evaluations e
-            INNER JOIN (
-                SELECT subject, MAX(timestamp) as latest_time
-                FROM evaluations
-                WHERE roll_no = ?
-                GROUP BY subject
-            ) latest_eval
-            ON e.subject = latest_eval.subject AND e.timestamp = latest_eval.latest_time
             WHERE e.roll_no = ?
-        ''', (roll_no, roll_no)).fetchall()
+        ''', (roll_no,)).fetchall()
 
         if not subject_performance:
             return render_template("error.html", message="No evaluation data found for this student"), 404
 
-        # Calculate semester GPA
         total_credits = sum(row['credits'] for row in subject_performance)
-        weighted_gpa = sum(row['avg_grade_point'] * row['credits'] for row in subject_performance)
-        
-        # Check for any failed subjects (grade point 0)
-        failed_subjects = any(row['avg_grade_point'] == 0.0 for row in subject_performance)
-        if failed_subjects:
-            semester_gpa = 0.0
-        elif total_credits > 0:
-            semester_gpa = weighted_gpa / total_credits
-        else:
-            semester_gpa = 0.0
+        semester_gpa = student_semester_gpa(db, roll_no)
 
         # Prepare data for Excel
         data = {
@@ -602,18 +819,65 @@ def download_semester_report(roll_no):
 
         output.seek(0)
         
-        filename = f"{roll_no}_semester_report.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        return store_export(key, changed_at, output, filename, XLSX_MIMETYPE)
 
     except Exception as e:
         app.logger.error(f"Semester report download error: {str(e)}", exc_info=True)
         return render_template("error.html", message=f"Could not generate semester report: {str(e)}"), 500
 
+@app.route("/ocr_cache/stats")
+def ocr_cache_stats():
+    return jsonify({**ocr_cache.stats(), "page_sources": page_source_stats()})
+
+@app.route("/ocr_cache/invalidate", methods=["POST"])
+def ocr_cache_invalidate():
+    digest = request.form.get('digest') or request.args.get('digest')
+    removed = ocr_cache.invalidate(digest)
+    return jsonify({"removed": removed, "digest": digest})
+
+@app.route("/export_cache/stats")
+def export_cache_stats():
+    return jsonify(export_cache.stats())
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition: stage histograms plus OCR, cache and queue counters"""
+    gemini = gemini_client.stats()
+    ocr = ocr_cache.stats()
+    exports = export_cache.stats()
+    pages = page_source_stats()
+    lines = stage_seconds.render() + ocr_page_seconds.render()
+    lines += encode_batch_texts.render() + encode_queue_seconds.render()
+    lines += render_value("grademate_ocr_fallbacks_total", "Pages sent to Tesseract after Gemini failed.",
+                          "counter", gemini['fallbacks'])
+    lines += render_value("grademate_gemini_requests_total", "Gemini requests by outcome.", "counter", {
+        (("outcome", outcome),): gemini[outcome] for outcome in ("requests", "transient_errors", "errors", "retries")})
+    lines += render_value("grademate_cache_hits_total", "Cache lookups that were served from the cache.", "counter", {
+        (("cache", "ocr"),): ocr['hits'],
+        (("cache", "embedding"),): embedding_cache.hits,
+        (("cache", "export"),): exports['hits']})
+    lines += render_value("grademate_cache_misses_total", "Cache lookups that had to be computed.", "counter", {
+        (("cache", "ocr"),): ocr['misses'],
+        (("cache", "embedding"),): embedding_cache.misses,
+        (("cache", "export"),): exports['misses']})
+    lines += render_value("grademate_pages_total", "PDF pages read, by extraction path.", "counter", {
+        (("source", "text_layer"),): pages['text_layer_pages'],
+        (("source", "ocr"),): pages['ocr_pages']})
+    lines += render_value("grademate_job_queue_depth", "Evaluation jobs waiting for a worker.", "gauge",
+                          job_queue.depth())
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+@app.route("/gemini/stats")
+def gemini_stats():
+    return jsonify(gemini_client.stats())
+
+@app.route("/encode/stats")
+def encode_stats():
+    return jsonify(encode_batcher.stats())
+
 if __name__ == "__main__":
     init_db()
+    # With the reloader on, only the serving child process should run jobs
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_job_workers()
     app.run(debug=True)
\ No newline at end of file
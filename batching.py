@@ -0,0 +1,115 @@
+"""Micro-batching of encode calls made by concurrent threads.
+
+Callers block in `MicroBatcher.encode`. A single batching thread takes the
+first waiting request, gathers whatever else arrives within `wait_ms` or
+until `max_batch` texts are queued, encodes the distinct texts in one
+forward pass and hands each caller its own rows.
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+from metrics import Histogram
+
+# Texts per forward pass, and how long requests waited to be batched
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+encode_batch_texts = Histogram("grademate_encode_batch_texts", "Distinct texts encoded per batched forward pass.",
+                               "batcher", buckets=BATCH_SIZE_BUCKETS)
+encode_queue_seconds = Histogram("grademate_encode_queue_seconds", "Time an encode request waited to join a batch.",
+                                 "batcher")
+
+class PendingEncode:
+    """One caller's texts, waiting for the batch that includes them"""
+
+    def __init__(self, texts, batch_size):
+        self.texts = texts
+        self.batch_size = batch_size
+        self.queued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.vectors = None
+        self.error = None
+
+class MicroBatcher:
+    """Coalesces encode(texts) calls from many threads into shared batches for `encode_fn`"""
+
+    def __init__(self, encode_fn, wait_ms, max_batch, name):
+        self.encode_fn = encode_fn
+        self.wait = wait_ms / 1000
+        self.max_batch = max_batch
+        self.name = name
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.counts = {"requests": 0, "batches": 0, "texts": 0, "encoded_texts": 0}
+
+    def encode(self, texts, batch_size=32):
+        """Queue texts for the next batch and wait for their vectors"""
+        self.start()
+        request = PendingEncode(list(texts), batch_size)
+        self.pending.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.vectors
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name=f"{self.name}-batcher", daemon=True)
+                self.thread.start()
+
+    def next_batch(self):
+        """Block for one request, then take whatever else arrives within the wait window"""
+        batch = [self.pending.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            started = time.perf_counter()
+            # Concurrent evaluations of one subject send the same model answers; encode each text once
+            unique = list(dict.fromkeys(text for request in batch for text in request.texts))
+            try:
+                if unique:
+                    vectors = np.asarray(self.encode_fn(unique, max(r.batch_size for r in batch)), dtype=np.float32)
+                else:
+                    vectors = np.zeros((0, 0), dtype=np.float32)
+                rows = {text: index for index, text in enumerate(unique)}
+                for request in batch:
+                    request.vectors = vectors[[rows[text] for text in request.texts]]
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+
+            encode_batch_texts.observe(self.name, len(unique))
+            for request in batch:
+                encode_queue_seconds.observe(self.name, started - request.queued_at)
+            with self.lock:
+                self.counts["requests"] += len(batch)
+                self.counts["batches"] += 1
+                self.counts["texts"] += sum(len(request.texts) for request in batch)
+                self.counts["encoded_texts"] += len(unique)
+            for request in batch:
+                request.done.set()
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        counts["avg_batch_requests"] = round(counts["requests"] / counts["batches"], 2) if counts["batches"] else 0.0
+        counts["wait_ms"] = self.wait * 1000
+        counts["max_batch"] = self.max_batch
+        return counts
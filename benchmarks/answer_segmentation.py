@@ -0,0 +1,154 @@
+"""Answer segmentation speed and accuracy on long OCR dumps.
+
+Builds --dumps synthetic OCR dumps of --pages pages each, joined the way
+the OCR readers join pages. A dump mixes the heading styles students and
+question papers use ("1. a)", "Q1(b)", "2.a", "Question 3:", "Ans 4"),
+unit headers, "Page n of m" markers, answers that run over a page break,
+answers continued under a repeated heading, "a)" / "(b)" lists inside
+answers, and answer lines that start with "Unit 2 covers ..." and must
+not be taken for unit headers.
+
+It times utils.extract_answers and, for comparison, the line-by-line
+extractor it replaced. It also counts how many answers each one returns
+exactly as written.
+
+    python benchmarks/answer_segmentation.py --pages 100 --dumps 5
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import WORDS, percentile
+
+LINES_PER_PAGE = 40
+WORDS_PER_LINE = 12
+
+LEGACY_ANSWER_START_RE = re.compile(r"^(?:Q(?:uestion\s*)?)?(\d+[a-zA-Z]*)[\s.):-]+\s*(.*)", re.IGNORECASE)
+
+def legacy_extract_answers(text):
+    """The line-by-line extractor, kept here as the baseline"""
+    answers = {}
+    current_q = None
+    current_ans = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        match = LEGACY_ANSWER_START_RE.match(line)
+        if match:
+            if current_q:
+                answers[current_q] = ' '.join(current_ans).strip()
+            current_q = match.group(1)
+            current_ans = [match.group(2).strip()]
+        else:
+            current_ans.append(line)
+    if current_q:
+        answers[current_q] = ' '.join(current_ans).strip()
+    return answers
+
+def heading(rng, number, part):
+    """A question heading in one of the styles seen on scripts"""
+    styles = [f"{number}{part})", f"Q{number}({part})" if part else f"Q{number}.", f"{number}.{part}" if part else f"{number}.",
+              f"{number}. {part})" if part else f"{number})", f"Question {number}{part}:", f"Ans {number}{part}"]
+    return rng.choice(styles)
+
+def build_dump(rng, pages):
+    """OCR text of `pages` pages and the answers written on them, {key: text}"""
+    from segmentation import PAGE_BREAK
+
+    lines = []
+    expected = {}
+    number = 0
+    while len(lines) < pages * LINES_PER_PAGE:
+        number += 1
+        if number % 5 == 1:
+            lines.append(f"UNIT - {'I' * (number // 5 % 3 + 1)}: {rng.choice(WORDS).title()}")
+        parts = "abc"[:rng.randint(0, 3)] or [""]
+        for part in parts:
+            key = f"{number}{part}"
+            body = [" ".join(rng.choice(WORDS) for _ in range(WORDS_PER_LINE)) for _ in range(rng.randint(2, 12))]
+            if rng.random() < 0.3:
+                # An enumerated list inside the answer, which must not be read as sub-part headings
+                style = rng.choice(["{})", "({})"])
+                items = [style.format(letter) + " " + " ".join(rng.choice(WORDS) for _ in range(6))
+                         for letter in "abcd"[:rng.randint(2, 4)]]
+                at = rng.randint(1, len(body))
+                body[at:at] = items
+            if rng.random() < 0.1:
+                # Prose that starts like a unit header stays part of the answer
+                body.insert(rng.randint(1, len(body)), f"Unit {rng.randint(1, 5)} {' '.join(rng.choice(WORDS) for _ in range(8))}")
+            split = rng.randint(1, len(body)) if rng.random() < 0.15 else len(body)
+            lines.append(f"{heading(rng, number, part)} {body[0]}")
+            lines.extend(body[1:split])
+            expected[key] = body[:split]
+        if rng.random() < 0.1 and len(body) > split:
+            # The student comes back to the last part later under a repeated heading
+            lines.append(f"Q{number}{part} (contd.)")
+            lines.extend(body[split:])
+            expected[key] = body[:split] + ["(contd.)"] + body[split:]
+
+    page_texts = []
+    for page in range(pages):
+        page_lines = lines[page * LINES_PER_PAGE:(page + 1) * LINES_PER_PAGE]
+        page_texts.append("\n".join([f"Page {page + 1} of {pages}"] + page_lines))
+    written = lines[:pages * LINES_PER_PAGE]
+    # Keep only answers whose last line made it onto the pages
+    expected = {key: " ".join(body) for key, body in expected.items() if body[-1] in written}
+    return PAGE_BREAK.join(page_texts), expected
+
+def measure(extract, dumps, repeat):
+    seconds = []
+    correct = found = total = 0
+    for text, expected in dumps:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            answers = extract(text)
+            seconds.append(time.perf_counter() - started)
+        found += sum(key in answers for key in expected)
+        correct += sum(answers.get(key) == answer for key, answer in expected.items())
+        total += len(expected)
+    pages = sum(text.count("\f") + 1 for text, _ in dumps) / len(dumps)
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "pages_per_second": round(pages / (sum(seconds) / len(seconds))),
+        "answers_expected": total,
+        "answers_found": found,
+        "answers_exact": correct
+    }
+
+def main():
+    from utils import extract_answers
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--dumps", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    dumps = [build_dump(rng, args.pages) for _ in range(args.dumps)]
+    extract_answers(dumps[0][0])
+    results = {
+        "pages": args.pages,
+        "dumps": args.dumps,
+        "characters": sum(len(text) for text, _ in dumps) // len(dumps),
+        "extract_answers": measure(extract_answers, dumps, args.repeat),
+        "line_by_line": measure(legacy_extract_answers, dumps, args.repeat)
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compare embedding backends on the answers already stored in question_results.
+
+Stored similarities came from the production model (full-precision
+paraphrase-mpnet-base-v2). Each candidate backend re-scores the same answer
+pairs. The script reports pairs/second and how closely its similarities
+and marks agree with the stored ones.
+
+    python benchmarks/embedding_backends.py --candidate torch-int8 \
+        --candidate torch:all-MiniLM-L6-v2 --candidate onnx
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_backends import EMBEDDING_MODEL, create_backend
+from evaluator import pairwise_cosine
+
+def load_pairs(database, limit):
+    conn = sqlite3.connect(database)
+    rows = conn.execute('''SELECT student_answer, model_answer, similarity, max_marks
+        FROM question_results
+        WHERE student_answer IS NOT NULL AND model_answer IS NOT NULL
+        LIMIT ?''', (limit,)).fetchall()
+    conn.close()
+    return rows
+
+def benchmark(spec, rows, batch_size):
+    name, _, model_name = spec.partition(":")
+    backend = create_backend(name, model_name or EMBEDDING_MODEL)
+
+    started = time.perf_counter()
+    backend.encode(["warm up"])
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    emb1 = backend.encode([row[0] for row in rows], batch_size)
+    emb2 = backend.encode([row[1] for row in rows], batch_size)
+    similarities = np.round(pairwise_cosine(emb1, emb2) * 100, 2)
+    elapsed = time.perf_counter() - started
+
+    stored = np.array([row[2] for row in rows], dtype=np.float64)
+    max_marks = np.array([row[3] or 0 for row in rows], dtype=np.float64)
+    diff = np.abs(similarities - stored)
+    mark_diff = diff / 100 * max_marks
+    return {
+        "backend": backend.name,
+        "model": backend.model_name,
+        "load_seconds": round(load_seconds, 3),
+        "pairs_per_second": round(len(rows) / elapsed, 2),
+        "similarity_mae": round(float(diff.mean()), 3),
+        "similarity_max_error": round(float(diff.max()), 3),
+        "pearson_r": round(float(np.corrcoef(similarities, stored)[0, 1]), 4) if len(rows) > 1 else None,
+        "within_2_points": round(float((diff <= 2).mean()), 4),
+        "mark_mae": round(float(mark_diff.mean()), 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="evaluations.db")
+    parser.add_argument("--candidate", action="append",
+                        help="backend[:model], e.g. torch, torch-int8, onnx, torch:all-MiniLM-L6-v2")
+    parser.add_argument("--limit", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    rows = load_pairs(args.database, args.limit)
+    if not rows:
+        sys.exit(f"No question_results rows in {args.database}")
+
+    report = {"pairs": len(rows), "results": []}
+    for spec in args.candidate or ["torch", "torch-int8"]:
+        try:
+            report["results"].append(benchmark(spec, rows, args.batch_size))
+        except Exception as e:
+            report["results"].append({"candidate": spec, "error": str(e)})
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Encode throughput of concurrent evaluations, with and without micro-batching.
+
+Each of --callers threads plays an evaluation: it repeatedly encodes
+--texts-per-call answers, as score_scripts does for one script. "direct"
+sends every call to the backend on its own. "batched" puts a MicroBatcher
+in front, as evaluator.encode does.
+
+--backend simulated models a CPU-bound encoder without loading a model.
+Each forward pass holds the CPU for --call-ms plus --text-ms per text.
+
+    python benchmarks/encode_batching.py --callers 16 --wait-ms 3
+    python benchmarks/encode_batching.py --backend configured --callers 8
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batching import MicroBatcher
+
+class SimulatedBackend:
+    """Fixed per-pass overhead plus per-text cost, one pass at a time like a model using every core"""
+
+    def __init__(self, call_ms, text_ms, dim=768):
+        self.call_seconds = call_ms / 1000
+        self.text_seconds = text_ms / 1000
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def encode(self, texts, batch_size=32):
+        with self.lock:
+            self.calls += 1
+            time.sleep(self.call_seconds + self.text_seconds * len(texts))
+        return np.ones((len(texts), self.dim), dtype=np.float32)
+
+def run(encode, callers, calls, texts_per_call):
+    latencies = []
+    lock = threading.Lock()
+
+    def evaluation(caller):
+        for call in range(calls):
+            texts = [f"caller {caller} call {call} answer {n}" for n in range(texts_per_call)]
+            started = time.perf_counter()
+            encode(texts, 32)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        list(executor.map(evaluation, range(callers)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "seconds": round(elapsed, 3),
+        "texts_per_second": round(callers * calls * texts_per_call / elapsed, 1),
+        "call_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "call_p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["simulated", "configured"], default="simulated")
+    parser.add_argument("--callers", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--texts-per-call", type=int, default=6)
+    parser.add_argument("--wait-ms", type=float, default=3)
+    parser.add_argument("--max-batch", type=int, default=128)
+    parser.add_argument("--call-ms", type=float, default=15, help="simulated overhead per forward pass")
+    parser.add_argument("--text-ms", type=float, default=1, help="simulated cost per text")
+    args = parser.parse_args()
+
+    if args.backend == "simulated":
+        backend = SimulatedBackend(args.call_ms, args.text_ms)
+    else:
+        from embedding_backends import create_backend
+        backend = create_backend()
+        backend.encode(["warm up"])
+
+    direct = run(backend.encode, args.callers, args.calls, args.texts_per_call)
+    batcher = MicroBatcher(backend.encode, args.wait_ms, args.max_batch, "benchmark")
+    batched = run(batcher.encode, args.callers, args.calls, args.texts_per_call)
+
+    print(json.dumps({
+        "backend": args.backend,
+        "callers": args.callers,
+        "texts_per_call": args.texts_per_call,
+        "direct": direct,
+        "batched": {**batched, **batcher.stats()},
+        "speedup": round(direct["seconds"] / batched["seconds"], 2)
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Peak memory and time of the class report export, in-memory pandas vs streaming.
+
+    python benchmarks/export_memory.py --students 10000 --subjects 8
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from database import connect, create_tables, migrate
+from exports import export_report
+
+GRADES = [('O', 10.0), ('A+', 9.0), ('A', 8.0), ('B+', 7.0), ('B', 6.0), ('C', 5.0), ('F', 0.0)]
+
+def populate(path, students, subjects):
+    conn = connect(path)
+    create_tables(conn)
+    rng = random.Random(3)
+    conn.executemany('INSERT INTO students (roll_no, full_name) VALUES (?, ?)',
+                     [(f"21VV1A{n:05d}", f"Student {n}") for n in range(students)])
+    conn.executemany('''INSERT INTO evaluations (roll_no, subject, timestamp, total_marks, percentage, grade,
+        grade_point, credits) VALUES (?, ?, '2025-01-01T10:00:00', 40, 60, ?, ?, 3)''',
+        [(f"21VV1A{n:05d}", f"SUBJ{s:02d}", *rng.choice(GRADES)) for n in range(students) for s in range(subjects)])
+    conn.commit()
+    migrate(conn)
+    return conn
+
+def export_in_memory(db):
+    """The previous download_excel: pivot through dicts and a DataFrame into a BytesIO workbook"""
+    rows = db.execute('''SELECT e.roll_no, s.full_name, e.subject, e.grade, e.grade_point, e.credits
+        FROM evaluations e LEFT JOIN students s ON e.roll_no = s.roll_no''').fetchall()
+    student_data = defaultdict(dict)
+    for row in rows:
+        student_data[row['roll_no']]["Student Name"] = row['full_name']
+        student_data[row['roll_no']][f"{row['subject']} Grade"] = row['grade']
+        student_data[row['roll_no']][f"{row['subject']} GPA"] = round(row['grade_point'], 2)
+        student_data[row['roll_no']][f"{row['subject']} Credits"] = row['credits']
+    df = pd.DataFrame([{"Roll No": roll, **data} for roll, data in student_data.items()]).fillna("")
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name="Student Report")
+    return len(output.getvalue())
+
+def export_streaming(db, fmt):
+    return sum(len(chunk) for chunk in export_report(db, fmt))
+
+def measure(fn):
+    """Time an untraced run, then trace a second run for peak Python memory"""
+    started = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 2), "peak_mb": round(peak / 2 ** 20, 1), "bytes": size}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--subjects", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        db = populate(os.path.join(folder, "evaluations.db"), args.students, args.subjects)
+        report = {
+            "students": args.students,
+            "subjects": args.subjects,
+            "in_memory_xlsx": measure(lambda: export_in_memory(db)),
+            "streaming_xlsx": measure(lambda: export_streaming(db, "xlsx")),
+            "streaming_csv": measure(lambda: export_streaming(db, "csv"))
+        }
+        db.close()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Measure GeminiClient throughput against a fake model, without network access.
+
+    python benchmarks/gemini_throughput.py --pages 200 --concurrency 8 --rpm 600 --latency 0.2 --error-rate 0.1
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.api_core import exceptions as google_exceptions
+from gemini_client import GeminiClient
+
+class FakeGeminiModel:
+    """Stands in for genai.GenerativeModel: fixed latency plus random 429s"""
+
+    def __init__(self, latency, error_rate):
+        self.latency = latency
+        self.error_rate = error_rate
+
+    def generate_content(self, parts):
+        time.sleep(self.latency * random.uniform(0.8, 1.2))
+        if random.random() < self.error_rate:
+            raise google_exceptions.ResourceExhausted("fake quota exceeded")
+
+        class Response:
+            text = f"1a) extracted text for {parts[1]}"
+        return Response
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=600)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--backoff", type=float, default=0.05)
+    args = parser.parse_args()
+
+    client = GeminiClient(model=FakeGeminiModel(args.latency, args.error_rate),
+                          max_concurrency=args.concurrency, requests_per_minute=args.rpm,
+                          backoff_seconds=args.backoff)
+
+    def ocr(page_number):
+        try:
+            return client.generate(["Extract all text", f"page-{page_number}"])
+        except Exception:
+            client.record_fallback(page_number)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(ocr, range(1, args.pages + 1)))
+    elapsed = time.perf_counter() - started
+
+    stats = client.stats()
+    stats.pop("fallbacks_by_page")
+    print(json.dumps({"pages": args.pages, "seconds": round(elapsed, 3),
+                      "pages_per_second": round(args.pages / elapsed, 2), **stats}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Tesseract speed and accuracy with page preprocessing on and off.
+
+Writes synthetic scanned model answers. Each page is rasterized, tinted
+like paper, skewed by up to --max-skew degrees, speckled with noise and
+saved image-only. Every page is then rendered as extract_text_from_scanned_pdf
+renders it and OCRed once per --steps configuration. The report gives:
+
+- OCR seconds per page (p50/p99), split into preprocessing and Tesseract time
+- accuracy: how many question keys extract_answers recovered, and the word
+  similarity of each recovered answer to the text that was written
+
+An empty --steps value is the pipeline off.
+
+    python benchmarks/ocr_preprocess.py --pages 4
+    python benchmarks/ocr_preprocess.py --steps "" --steps grayscale,binarize --steps grayscale,deskew,crop
+"""
+import argparse
+import difflib
+import json
+import os
+import random
+import sys
+import tempfile
+import textwrap
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import LINES_PER_PAGE, WRAP_WIDTH, answer_text, percentile
+
+SCAN_DPI = 300
+
+def scan(image, rng, max_skew, noise):
+    """Make a clean page render look like a phone or flatbed scan"""
+    from PIL import Image
+
+    page = np.asarray(image.convert("RGB"), dtype=np.float32)
+    # Off-white, slightly uneven paper and gray rather than black ink
+    paper = np.array([236, 230, 212], dtype=np.float32)
+    shade = np.linspace(1.0, 0.9, page.shape[0], dtype=np.float32)[:, None, None]
+    page = (page / 255 * (paper - 60) + 60) * shade
+    page += np.random.default_rng(rng.randrange(1 << 30)).normal(0, noise, page.shape[:2])[:, :, None]
+    image = Image.fromarray(np.clip(page, 0, 255).astype(np.uint8))
+    angle = rng.uniform(-max_skew, max_skew)
+    return image.rotate(angle, resample=Image.Resampling.BICUBIC, fillcolor=tuple(int(c) for c in paper)), angle
+
+def build_scans(path, pages, max_skew, noise, seed):
+    """Write an image-only model answer of `pages` pages; returns the answers written on it"""
+    import fitz
+    from PIL import Image
+
+    rng = random.Random(seed)
+    answers = {}
+    lines = []
+    question = 0
+    while len(lines) < pages * LINES_PER_PAGE:
+        question += 1
+        for part in "ab":
+            key = f"{question}{part}"
+            answers[key] = answer_text(rng, rng.randint(30, 80))
+            lines.extend(textwrap.wrap(f"{key}) {answers[key]}", WRAP_WIDTH))
+
+    clean = fitz.open()
+    for start in range(0, len(lines), LINES_PER_PAGE):
+        page = clean.new_page()
+        for offset, line in enumerate(lines[start:start + LINES_PER_PAGE]):
+            page.insert_text((50, 60 + offset * 13), line, fontsize=10)
+    # Answers cut off by the page limit weren't written in full, so don't score them
+    written = "\n".join(lines[:pages * LINES_PER_PAGE])
+    answers = {key: text for key, text in answers.items() if f"{key}) " in written}
+
+    scanned = fitz.open()
+    skews = []
+    for page in list(clean)[:pages]:
+        pixmap = page.get_pixmap(dpi=SCAN_DPI)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+        image, angle = scan(image, rng, max_skew, noise)
+        skews.append(round(angle, 2))
+        out = scanned.new_page(width=page.rect.width, height=page.rect.height)
+        out.insert_image(out.rect, stream=image_bytes(image))
+    scanned.save(path)
+    return answers, skews
+
+def image_bytes(image):
+    import io
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+def word_similarity(expected, actual):
+    return difflib.SequenceMatcher(None, expected.split(), actual.split(), autojunk=False).ratio()
+
+def run(path, answers, steps, dpi):
+    import fitz
+    import pytesseract
+    from document import render_page
+    from preprocess import preprocess_image
+    from utils import OCR_GRAYSCALE, extract_answers, tesseract_config
+
+    page_seconds = []
+    preprocess_seconds = []
+    texts = []
+    with fitz.open(path) as doc:
+        for page in doc:
+            image = render_page(page, dpi, OCR_GRAYSCALE)
+            started = time.perf_counter()
+            image, page_dpi = preprocess_image(image, dpi, steps) if steps else (image, dpi)
+            prepared = time.perf_counter()
+            texts.append(pytesseract.image_to_string(image, config=tesseract_config(page_dpi, steps)))
+            page_seconds.append(time.perf_counter() - started)
+            preprocess_seconds.append(prepared - started)
+
+    found = extract_answers("\n".join(texts))
+    similarities = [word_similarity(text, found.get(key, "")) for key, text in answers.items()]
+    return {
+        "steps": ",".join(steps) or "off",
+        "pages": len(page_seconds),
+        "seconds_per_page": round(sum(page_seconds) / len(page_seconds), 3),
+        "p50_page_seconds": round(percentile(page_seconds, 50), 3),
+        "p99_page_seconds": round(percentile(page_seconds, 99), 3),
+        "preprocess_seconds_per_page": round(sum(preprocess_seconds) / len(preprocess_seconds), 3),
+        "answers_found": sum(key in found for key in answers),
+        "answers_expected": len(answers),
+        "word_similarity": round(float(np.mean(similarities)), 4),
+        "exact_answers": sum(similarity == 1.0 for similarity in similarities)
+    }
+
+def main():
+    from preprocess import PREPROCESS_STEPS, parse_steps
+    from utils import OCR_DPI
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--steps", action="append",
+                        help=f"comma separated steps from {', '.join(PREPROCESS_STEPS)}; repeatable")
+    parser.add_argument("--dpi", type=int, default=OCR_DPI, help="resolution pages are rendered at for OCR")
+    parser.add_argument("--max-skew", type=float, default=3.0, help="largest scan skew, in degrees")
+    parser.add_argument("--noise", type=float, default=18.0, help="standard deviation of scan noise, in gray levels")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+    configurations = [parse_steps(value) for value in (args.steps or ["", ",".join(PREPROCESS_STEPS)])]
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "scanned_model.pdf")
+        answers, skews = build_scans(path, args.pages, args.max_skew, args.noise, args.seed)
+        results = {
+            "dpi": args.dpi,
+            "skews": skews,
+            "noise": args.noise,
+            "runs": [run(path, answers, steps, args.dpi) for steps in configurations]
+        }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""Offline benchmark suite for the grading pipeline.
+
+Generates synthetic question papers, model answers and student scripts at
+several sizes. It then times extract_max_marks, extract_answers,
+evaluate_pdfs and the report routes, and prints throughput, p50/p99
+latency and peak RSS as JSON. Each scenario and size runs in a fresh
+interpreter with its own temporary database, caches and fixtures, so
+peak RSS belongs to that scenario alone.
+
+Student pages go through the normal Gemini path. With --ocr stub, a
+stand-in model returns each page's known text after an optional
+--gemini-latency. With --ocr tesseract, the scripts and model answers are
+image-only and real Tesseract reads them. --embeddings hashing swaps the
+sentence-transformers model for a bag-of-words hash, for machines without
+the model.
+
+    python benchmarks/pipeline.py --size small --size medium --output before.json
+    python benchmarks/pipeline.py --size small --size medium --baseline before.json
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import types
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Main questions (each with parts a and b), words per answer, minimum pages per
+# script, and evaluations in the database behind the report routes
+SIZES = {
+    "small": {"questions": 3, "answer_words": 40, "pages": 2, "evaluations": 2000},
+    "medium": {"questions": 6, "answer_words": 120, "pages": 6, "evaluations": 20000},
+    "large": {"questions": 10, "answer_words": 300, "pages": 15, "evaluations": 100000},
+}
+SCENARIOS = ["marks", "segmentation", "evaluate", "reports"]
+
+WORDS = ("stack queue pointer array linked list node tree binary search hash table collision bucket "
+         "graph vertex edge traversal depth breadth recursion iteration complexity memory heap sort "
+         "merge quick insertion algorithm process thread scheduler deadlock semaphore mutex page frame "
+         "cache register instruction compiler parser token grammar database index transaction query").split()
+GRADES = [('O', 10.0), ('A+', 9.0), ('A', 8.0), ('B+', 7.0), ('B', 6.0), ('C', 5.0), ('F', 0.0)]
+LINES_PER_PAGE = 55
+WRAP_WIDTH = 90
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def answer_text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def misread(rng, text):
+    """The sort of damage OCR does to handwriting: dropped words and confused letters"""
+    words = []
+    for word in text.split():
+        roll = rng.random()
+        if roll < 0.05:
+            continue
+        if roll < 0.15:
+            word = word.replace("o", "0", 1).replace("l", "1", 1).replace("m", "rn", 1)
+        words.append(word)
+    return " ".join(words)
+
+def write_pdf(path, lines, min_pages=1, image_only=False):
+    """Lay out lines on A4 pages; image_only rasterizes them so there is no text layer"""
+    import fitz
+
+    per_page = max(1, min(LINES_PER_PAGE, -(-len(lines) // min_pages)))
+    doc = fitz.open()
+    for start in range(0, max(len(lines), 1), per_page):
+        page = doc.new_page()
+        page.insert_text((50, 40), f"Page {start // per_page + 1}", fontsize=9)
+        for offset, line in enumerate(lines[start:start + per_page]):
+            page.insert_text((50, 60 + offset * 13), line, fontsize=10)
+    while len(doc) < min_pages:
+        doc.new_page().insert_text((50, 40), f"Page {len(doc)}", fontsize=9)
+    if image_only:
+        scanned = fitz.open()
+        for page in doc:
+            pixmap = page.get_pixmap(dpi=150)
+            scanned.new_page(width=page.rect.width, height=page.rect.height).insert_image(
+                page.rect, pixmap=pixmap)
+        doc = scanned
+    doc.save(path)
+    doc.close()
+
+def answer_lines(answers):
+    lines = []
+    for key, text in answers.items():
+        lines.extend(textwrap.wrap(f"{key}) {text}", WRAP_WIDTH))
+    return lines
+
+def build_fixtures(folder, size, image_only):
+    """Question paper, model answer and student script PDFs, and the text written on the student script"""
+    spec = SIZES[size]
+    rng = random.Random(11)
+    keys = [f"{q}{part}" for q in range(1, spec["questions"] + 1) for part in "ab"]
+    model_answers = {key: answer_text(rng, spec["answer_words"]) for key in keys}
+    student_answers = {key: misread(rng, text) for key, text in model_answers.items()}
+
+    question_lines = []
+    for q in range(1, spec["questions"] + 1):
+        question_lines.append(f"{q}. a) Explain the {rng.choice(WORDS)} {rng.choice(WORDS)} in detail. (7M)")
+        question_lines.append(f"b) Compare {rng.choice(WORDS)} and {rng.choice(WORDS)}. (3M)")
+
+    paths = {name: os.path.join(folder, f"{name}.pdf") for name in ("question", "model", "student")}
+    write_pdf(paths["question"], question_lines)
+    write_pdf(paths["model"], answer_lines(model_answers), image_only=image_only)
+    student_lines = answer_lines(student_answers)
+    write_pdf(paths["student"], student_lines, spec["pages"], image_only=image_only)
+    return paths, "\n".join(student_lines)
+
+class StubOCRModel:
+    """Stands in for the Gemini model: returns the known text of each rendered page"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.pages = {}
+
+    @staticmethod
+    def image_key(img):
+        return hashlib.sha1(img.tobytes()).hexdigest()
+
+    def register(self, pdf_path):
+        """Render the PDF exactly as the OCR path does and remember each page's text"""
+        from document import PDFDocument
+        from utils import OCR_DPI
+
+        doc = PDFDocument(pdf_path)
+        for page_number, img in doc.iter_page_images(OCR_DPI, grayscale=False):
+            self.pages[self.image_key(img)] = doc.page_texts[page_number - 1]
+
+    def generate_content(self, parts):
+        if self.latency:
+            time.sleep(self.latency)
+        text = self.pages.get(self.image_key(parts[1]))
+        if text is None:
+            raise ValueError("stub OCR model has no text for this page image")
+        return types.SimpleNamespace(text=text)
+
+class TesseractOCRModel:
+    """Gemini-shaped model that runs real Tesseract on the page image"""
+
+    def generate_content(self, parts):
+        import pytesseract
+        return types.SimpleNamespace(text=pytesseract.image_to_string(parts[1]))
+
+class HashingBackend:
+    """Bag-of-words hashing embedder, for timing the pipeline without the transformer model"""
+
+    name = "hashing"
+    cache_name = "hashing-benchmark"
+    model = "hashing"
+    dim = 256
+
+    def encode(self, texts, batch_size=32):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                vectors[row, int(hashlib.md5(token.encode()).hexdigest()[:8], 16) % self.dim] += 1.0
+        return vectors
+
+def populate_reports(path, evaluations, subjects=8):
+    from database import connect, create_tables, migrate
+
+    conn = connect(path)
+    create_tables(conn)
+    rng = random.Random(5)
+    students = max(1, evaluations // subjects)
+    conn.executemany('INSERT INTO students (roll_no, full_name, department) VALUES (?, ?, ?)',
+                     [(f"21VV1A{n:05d}", f"Student {n}", "CSE") for n in range(students)])
+    conn.executemany('''INSERT INTO evaluations (roll_no, subject, timestamp, total_marks, percentage, grade,
+        grade_point, credits) VALUES (?, ?, ?, ?, ?, ?, ?, 3)''',
+        [(f"21VV1A{n:05d}", f"SUBJ{s:02d}", f"2025-{s % 12 + 1:02d}-{n % 28 + 1:02d}T10:00:00",
+          rng.uniform(0, 70), rng.uniform(0, 100), *rng.choice(GRADES))
+         for n in range(students) for s in range(subjects)])
+    conn.commit()
+    migrate(conn)
+    conn.close()
+    return students
+
+def measure(operation, repeat, reset=None):
+    """Run once untimed to load code and models, then `repeat` timed runs; `reset` runs untimed before each"""
+    if reset:
+        reset()
+    operation()
+    timings = []
+    for _ in range(repeat):
+        if reset:
+            reset()
+        started = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - started)
+    total = sum(timings)
+    return {
+        "iterations": repeat,
+        "throughput_per_second": round(repeat / total, 2) if total else None,
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+    }
+
+def run_scenario(scenario, size, args, folder):
+    """Time one scenario in this process; returns {operation: stats}"""
+    import document
+    import utils
+    from gemini_client import GeminiClient
+
+    model = TesseractOCRModel() if args.ocr == "tesseract" else StubOCRModel(args.gemini_latency)
+    utils.gemini_client = GeminiClient(model=model, max_concurrency=utils.GEMINI_CONCURRENCY,
+                                       requests_per_minute=args.gemini_rpm)
+    paths, student_text = build_fixtures(folder, size, image_only=args.ocr == "tesseract")
+    if isinstance(model, StubOCRModel):
+        model.register(paths["student"])
+
+    def clear_documents():
+        if not args.warm:
+            document._load_document.cache_clear()
+
+    if scenario == "marks":
+        return {"extract_max_marks": measure(lambda: utils.extract_max_marks(paths["question"]),
+                                             args.repeat, clear_documents)}
+
+    if scenario == "segmentation":
+        return {"extract_answers": measure(lambda: utils.extract_answers(student_text), args.repeat)}
+
+    if scenario == "evaluate":
+        import evaluator
+
+        if args.embeddings == "hashing":
+            evaluator._backend = HashingBackend()
+        max_marks = utils.extract_max_marks(paths["question"])
+
+        def clear_caches():
+            clear_documents()
+            if not args.warm:
+                utils.ocr_cache.invalidate()
+                evaluator.embedding_cache.clear()
+
+        stats = measure(lambda: evaluator.evaluate_pdfs(paths["student"], paths["model"], max_marks),
+                        args.repeat, clear_caches)
+        pages = document.load_document(paths["student"]).page_count
+        stats["student_pages"] = pages
+        stats["pages_per_second"] = round(stats["throughput_per_second"] * pages, 2)
+        return {"evaluate_pdfs": stats}
+
+    if scenario == "reports":
+        from database import DATABASE
+
+        students = populate_reports(DATABASE, SIZES[size]["evaluations"])
+        import app as webapp
+
+        client = webapp.app.test_client()
+        roll_no = f"21VV1A{students // 2:05d}"
+
+        def clear_exports():
+            if not args.warm:
+                with webapp.export_cache.lock:
+                    webapp.export_cache.max_bytes = 0
+                    webapp.export_cache.evict()
+
+        def get(url):
+            def request():
+                response = client.get(url)
+                response.get_data()
+                assert response.status_code == 200, f"{url} returned {response.status_code}"
+            return request
+
+        return {
+            "reports": measure(get("/reports"), args.repeat),
+            "reports_sorted_by_marks": measure(get("/reports?sort=marks&order=desc"), args.repeat),
+            "student_report": measure(get(f"/student/{roll_no}"), args.repeat),
+            "export_csv": measure(get("/download_excel?format=csv"), args.repeat, clear_exports),
+            "export_xlsx": measure(get("/download_excel"), args.repeat, clear_exports),
+        }
+
+    raise ValueError(f"Unknown scenario {scenario!r}")
+
+def child(args):
+    """Entry point of the per-scenario interpreter; prints one JSON line"""
+    folder = os.getcwd()
+    # The pipeline prints OCR text and progress; keep stdout for the result
+    with contextlib.redirect_stdout(sys.stderr):
+        operations = run_scenario(args.scenario[0], args.size[0], args, folder)
+    for stats in operations.values():
+        stats["peak_rss_mb"] = peak_rss_mb()
+        stats["children_peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    print(json.dumps(operations))
+
+def spawn(scenario, size, args):
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--scenario", scenario, "--size", size,
+               "--repeat", str(args.repeat), "--ocr", args.ocr, "--embeddings", args.embeddings,
+               "--gemini-latency", str(args.gemini_latency), "--gemini-rpm", str(args.gemini_rpm)]
+    if args.warm:
+        command.append("--warm")
+    with tempfile.TemporaryDirectory() as folder:
+        env = dict(os.environ, PYTHONPATH=ROOT, DATABASE=os.path.join(folder, "evaluations.db"),
+                   CACHE_DATABASE=os.path.join(folder, "cache.db"),
+                   EXPORT_CACHE_DIR=os.path.join(folder, "export_cache"),
+                   JOB_WORKERS="0", WARM_UP_MODEL="0")
+        result = subprocess.run(command, cwd=folder, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit code {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{revision}-dirty" if dirty else revision
+
+def compare(results, baseline):
+    """Add the percentage change of p50, p99 and peak RSS against a previous run"""
+    previous = {(r["scenario"], r["size"], r["operation"]): r for r in baseline.get("results", [])}
+    for result in results:
+        before = previous.get((result["scenario"], result["size"], result["operation"]))
+        if not before or "error" in before or "error" in result:
+            continue
+        for metric in ("p50_ms", "p99_ms", "peak_rss_mb"):
+            if before.get(metric):
+                result[f"{metric}_change_pct"] = round((result[metric] - before[metric]) / before[metric] * 100, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append")
+    parser.add_argument("--size", choices=sorted(SIZES), action="append")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--ocr", choices=["stub", "tesseract"], default="stub")
+    parser.add_argument("--embeddings", choices=["configured", "hashing"], default="configured",
+                        help="'configured' uses EMBEDDING_BACKEND; 'hashing' needs no model")
+    parser.add_argument("--gemini-latency", type=float, default=0.0,
+                        help="seconds the stub OCR model sleeps per page")
+    parser.add_argument("--gemini-rpm", type=float, default=1e6)
+    parser.add_argument("--warm", action="store_true",
+                        help="keep the document, OCR, embedding and export caches between iterations")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    results = []
+    for size in args.size or ["small", "medium"]:
+        for scenario in args.scenario or SCENARIOS:
+            operations = spawn(scenario, size, args)
+            if "error" in operations:
+                operations = {scenario: operations}
+            for operation, stats in operations.items():
+                results.append({"scenario": scenario, "size": size, "operation": operation, **stats})
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    report = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "ocr": args.ocr,
+        "embeddings": args.embeddings,
+        "cache": "warm" if args.warm else "cold",
+        "sizes": {size: SIZES[size] for size in args.size or ["small", "medium"]},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
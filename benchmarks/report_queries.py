@@ -0,0 +1,136 @@
+"""Report query latency on a synthetic evaluations.db, before and after tuning.
+
+"before" is the original schema (no indexes, default journal) with the
+original /reports queries, including the per-student failed-subject check.
+"after" is the same data after the migrations, read through the tuned
+connection and the paginated report queries.
+
+    python benchmarks/report_queries.py --evaluations 100000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect, create_tables, migrate
+from report_queries import evaluation_history, student_gpas, subject_stats
+
+GRADES = [('O', 10.0), ('A+', 9.0), ('A', 8.0), ('B+', 7.0), ('B', 6.0), ('C', 5.0), ('F', 0.0)]
+DEPARTMENTS = ["CSE", "ECE", "EEE", "MECH", "CIVIL"]
+
+def populate(path, evaluations, subjects):
+    conn = sqlite3.connect(path)
+    create_tables(conn)
+    rng = random.Random(7)
+    students = evaluations // subjects
+    start = datetime(2024, 1, 1)
+    conn.executemany('INSERT INTO students (roll_no, full_name, department) VALUES (?, ?, ?)',
+                     [(f"21VV1A{n:05d}", f"Student {n}", DEPARTMENTS[n % len(DEPARTMENTS)]) for n in range(students)])
+    rows = []
+    for n in range(students):
+        for s in range(subjects):
+            grade, grade_point = rng.choice(GRADES)
+            stamp = (start + timedelta(minutes=rng.randrange(500000))).isoformat()
+            rows.append((f"21VV1A{n:05d}", f"SUBJ{s:02d}", stamp, rng.uniform(0, 70), rng.uniform(0, 100),
+                         grade, grade_point, 3))
+    conn.executemany('''INSERT INTO evaluations (roll_no, subject, timestamp, total_marks, percentage, grade,
+        grade_point, credits) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+    conn.commit()
+    conn.close()
+    return students
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 2)
+
+def reports_before(conn, n_plus_one_sample):
+    """The original /reports route in ms; the per-student loop runs on a sample and is scaled up"""
+    started = time.perf_counter()
+    conn.execute('''SELECT e.*, strftime('%d/%m/%Y %H:%M', e.timestamp) as formatted_date, s.full_name
+        FROM evaluations e LEFT JOIN students s ON e.roll_no = s.roll_no
+        ORDER BY e.timestamp DESC''').fetchall()
+    gpa_data = conn.execute('''SELECT e.roll_no, s.full_name,
+            SUM(e.grade_point * e.credits) / SUM(e.credits) as gpa, COUNT(*) as exams_taken
+        FROM evaluations e LEFT JOIN students s ON e.roll_no = s.roll_no
+        GROUP BY e.roll_no''').fetchall()
+    loop_started = time.perf_counter()
+    for student in gpa_data[:n_plus_one_sample]:
+        conn.execute('SELECT grade_point FROM evaluations WHERE roll_no = ?', (student[0],)).fetchall()
+    loop_seconds = time.perf_counter() - loop_started
+    conn.execute('''SELECT subject, AVG(percentage), COUNT(*), AVG(grade_point), credits
+        FROM evaluations GROUP BY subject''').fetchall()
+    sampled = max(1, min(n_plus_one_sample, len(gpa_data)))
+    elapsed = time.perf_counter() - started - loop_seconds
+    return (elapsed + loop_seconds / sampled * len(gpa_data)) * 1000
+
+def reports_after(conn, page=None):
+    student_gpas(conn, after=page)
+    evaluation_history(conn)
+    subject_stats(conn)
+
+def student_report(conn, roll_no):
+    """The three queries behind /student/<roll_no>"""
+    conn.execute('''SELECT e.*, strftime('%d/%m/%Y %H:%M', e.timestamp) as formatted_date, s.full_name
+        FROM evaluations e LEFT JOIN students s ON e.roll_no = s.roll_no
+        WHERE e.roll_no = ? ORDER BY e.timestamp DESC LIMIT 1''', (roll_no,)).fetchone()
+    conn.execute('''SELECT e.subject, e.total_marks, e.percentage, e.grade, e.grade_point, e.credits
+        FROM evaluations e WHERE e.roll_no = ? ORDER BY e.timestamp DESC''', (roll_no,)).fetchall()
+    conn.execute('''SELECT e.subject, e.percentage, e.grade_point, e.credits
+        FROM evaluations e
+        INNER JOIN (SELECT subject, MAX(timestamp) as latest_time FROM evaluations
+                    WHERE roll_no = ? GROUP BY subject) latest_eval
+        ON e.subject = latest_eval.subject AND e.timestamp = latest_eval.latest_time
+        WHERE e.roll_no = ?''', (roll_no, roll_no)).fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--evaluations", type=int, default=100000)
+    parser.add_argument("--subjects", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--n-plus-one-sample", type=int, default=200,
+                        help="students checked one by one in the 'before' run; the rest is extrapolated")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "evaluations.db")
+        students = populate(path, args.evaluations, args.subjects)
+        roll_no = f"21VV1A{students // 2:05d}"
+
+        conn = sqlite3.connect(path)
+        before_reports = round(statistics.median(
+            reports_before(conn, args.n_plus_one_sample) for _ in range(args.repeat)), 2)
+        before_student = timed(lambda: student_report(conn, roll_no), args.repeat)
+        conn.close()
+
+        conn = connect(path)
+        migrate(conn)
+        middle = [f"21VV1A{students // 2:05d}"]
+        after_reports = timed(lambda: reports_after(conn), args.repeat)
+        after_reports_deep = timed(lambda: reports_after(conn, middle), args.repeat)
+        after_student = timed(lambda: student_report(conn, roll_no), args.repeat)
+        conn.close()
+
+    print(json.dumps({
+        "evaluations": args.evaluations,
+        "students": students,
+        "reports_before_ms": before_reports,
+        "reports_after_first_page_ms": after_reports,
+        "reports_after_middle_page_ms": after_reports_deep,
+        "student_report_before_ms": before_student,
+        "student_report_after_ms": after_student
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
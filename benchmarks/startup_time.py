@@ -0,0 +1,53 @@
+"""Compare process startup cost for report-only and grading entry points.
+
+Each scenario runs in a fresh interpreter. The script reports wall time and
+whether torch was imported.
+
+    python benchmarks/startup_time.py --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    # What setup_db.py and report-only workers do
+    "import_app": "import app",
+    # A grading worker that loads the model before taking its first job
+    "import_app_and_warm_up": "import app, evaluator; evaluator.warm_up()",
+}
+
+PROBE = "; import sys, json; print(json.dumps({'torch_loaded': 'torch' in sys.modules}))"
+
+def run(code):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code + PROBE], cwd=ROOT, capture_output=True,
+                            text=True, check=True).stdout
+    elapsed = time.perf_counter() - started
+    return elapsed, json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.scenario or SCENARIOS:
+        timings = []
+        for _ in range(args.repeat):
+            elapsed, probe = run(SCENARIOS[name])
+            timings.append(elapsed)
+        report[name] = {
+            "best_seconds": round(min(timings), 3),
+            "mean_seconds": round(sum(timings) / len(timings), 3),
+            **probe
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
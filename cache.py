@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Caches live in their own SQLite file next to evaluations.db
+CACHE_DATABASE = os.environ.get("CACHE_DATABASE", "cache.db")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+# Generated report files, evicted least-recently-used once they exceed the byte budget
+EXPORT_CACHE_DIR = os.environ.get("EXPORT_CACHE_DIR", "export_cache")
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get("EXPORT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+def normalize_text(text):
+    """Collapse whitespace so re-OCR'd copies of the same answer share a key"""
+    return " ".join(text.split())
+
+def text_key(text, model_name):
+    """Cache key for an embedding: hash of the model name and normalized text"""
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """On-disk embedding store with least-recently-used eviction"""
+
+    def __init__(self, path=CACHE_DATABASE, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS embedding_cache (
+            key TEXT PRIMARY KEY,
+            model_name TEXT,
+            dim INTEGER,
+            vector BLOB,
+            last_used REAL)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used)')
+        self.conn.commit()
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached and mark them as used"""
+        keys = list(keys)
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f'SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})', chunk).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            if found:
+                now = time.time()
+                self.conn.executemany('UPDATE embedding_cache SET last_used = ? WHERE key = ?',
+                                      [(now, key) for key in found])
+                self.conn.commit()
+        return found
+
+    def put_many(self, model_name, vectors):
+        """Store {key: vector} and evict the oldest entries beyond the size cap"""
+        now = time.time()
+        rows = [(key, model_name, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for key, vector in vectors.items()]
+        with self.lock:
+            self.conn.executemany('INSERT OR REPLACE INTO embedding_cache VALUES (?, ?, ?, ?, ?)', rows)
+            count = self.conn.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute('''DELETE FROM embedding_cache WHERE key IN (
+                    SELECT key FROM embedding_cache ORDER BY last_used LIMIT ?)''',
+                    (count - self.max_entries,))
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM embedding_cache')
+            self.conn.commit()
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class OCRCache:
+    """Per-page OCR text keyed by PDF digest, OCR engine and DPI"""
+
+    def __init__(self, path=CACHE_DATABASE):
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS ocr_cache (
+            digest TEXT NOT NULL,
+            engine TEXT NOT NULL,
+            dpi INTEGER NOT NULL,
+            pages TEXT,
+            created_at REAL,
+            PRIMARY KEY (digest, engine, dpi))''')
+        self.conn.commit()
+
+    def get(self, digest, engine, dpi):
+        """Return the cached list of page texts, or None on a miss"""
+        with self.lock:
+            row = self.conn.execute('SELECT pages FROM ocr_cache WHERE digest = ? AND engine = ? AND dpi = ?',
+                                    (digest, engine, dpi)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, digest, engine, dpi, pages):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO ocr_cache VALUES (?, ?, ?, ?, ?)',
+                              (digest, engine, dpi, json.dumps(pages), time.time()))
+            self.conn.commit()
+
+    def invalidate(self, digest=None):
+        """Drop cached text for one PDF digest, or everything when no digest is given"""
+        with self.lock:
+            if digest:
+                removed = self.conn.execute('DELETE FROM ocr_cache WHERE digest = ?', (digest,)).rowcount
+            else:
+                removed = self.conn.execute('DELETE FROM ocr_cache').rowcount
+            self.conn.commit()
+        return removed
+
+    def stats(self):
+        with self.lock:
+            documents, pages_bytes = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(pages)), 0) FROM ocr_cache').fetchone()
+            by_engine = dict(self.conn.execute('SELECT engine, COUNT(*) FROM ocr_cache GROUP BY engine').fetchall())
+        lookups = self.hits + self.misses
+        return {
+            "documents": documents,
+            "bytes": pages_bytes,
+            "by_engine": by_engine,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+class ExportCache:
+    """Generated export files on disk, indexed in the cache database and evicted by total size"""
+
+    def __init__(self, path=CACHE_DATABASE, folder=EXPORT_CACHE_DIR, max_bytes=EXPORT_CACHE_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(folder, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS export_cache (
+            key TEXT PRIMARY KEY,
+            size INTEGER,
+            created_at REAL,
+            last_used REAL)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_export_cache_last_used ON export_cache(last_used)')
+        self.conn.commit()
+
+    def file_path(self, key):
+        return os.path.join(self.folder, key)
+
+    def get(self, key):
+        """Path of the cached file for `key`, or None on a miss"""
+        path = self.file_path(key)
+        with self.lock:
+            found = self.conn.execute('SELECT 1 FROM export_cache WHERE key = ?', (key,)).fetchone()
+            if found and os.path.exists(path):
+                self.hits += 1
+                self.conn.execute('UPDATE export_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+                self.conn.commit()
+                return path
+            if found:
+                self.conn.execute('DELETE FROM export_cache WHERE key = ?', (key,))
+                self.conn.commit()
+            self.misses += 1
+        return None
+
+    def put(self, key, chunks):
+        """Write an iterable of byte chunks as the file for `key` and return its path"""
+        path = self.file_path(key)
+        partial = f"{path}.{threading.get_ident()}.part"
+        size = 0
+        try:
+            with open(partial, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        now = time.time()
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO export_cache VALUES (?, ?, ?, ?)', (key, size, now, now))
+            self.evict(keep=key)
+            self.conn.commit()
+        return path
+
+    def evict(self, keep=None):
+        """Drop least-recently-used files until the cache fits in max_bytes; call with the lock held"""
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM export_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute(
+                'SELECT key, size FROM export_cache WHERE key != ? ORDER BY last_used', (keep or "",)).fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute('DELETE FROM export_cache WHERE key = ?', (key,))
+            if os.path.exists(self.file_path(key)):
+                os.remove(self.file_path(key))
+            total -= size
+
+    def stats(self):
+        with self.lock:
+            files, total = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM export_cache').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "files": files,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
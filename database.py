@@ -0,0 +1,231 @@
+import argparse
+import os
+import sqlite3
+import threading
+
+from summaries import create_summary_tables, rebuild_summaries
+
+DATABASE = os.environ.get("DATABASE", "evaluations.db")
+# Applied to every connection. WAL lets report reads run while a grading job writes.
+DATABASE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 30000",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA cache_size = -{int(os.environ.get('DATABASE_CACHE_KB', '20000'))}",
+    f"PRAGMA mmap_size = {int(os.environ.get('DATABASE_MMAP_BYTES', str(128 * 1024 * 1024)))}",
+)
+
+# Current time as Unix seconds, in SQL
+NOW_SQL = "((julianday('now') - 2440587.5) * 86400.0)"
+
+_local = threading.local()
+
+def connect(path=DATABASE):
+    """New tuned connection that returns sqlite3.Row rows"""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    for pragma in DATABASE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_connection(path=DATABASE):
+    """This thread's connection to `path`, opened on first use and kept for the thread's lifetime"""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = connect(path)
+    return conn
+
+def release_connection(path=DATABASE):
+    """End a unit of work: roll back anything left uncommitted so the next user starts clean"""
+    conn = getattr(_local, "connections", {}).get(path)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+def close_connections():
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+
+def create_tables(conn):
+    """Base schema; indexes and later changes come from MIGRATIONS"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS evaluations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        roll_no TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        timestamp TEXT,
+        total_marks REAL,
+        percentage REAL,
+        grade TEXT,
+        grade_point REAL,
+        student_pdf_path TEXT,
+        model_pdf_path TEXT,
+        question_pdf_path TEXT,
+        credits INTEGER DEFAULT 3)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS students (
+        roll_no TEXT PRIMARY KEY,
+        full_name TEXT,
+        department TEXT)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS question_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        evaluation_id INTEGER,
+        question TEXT,
+        student_answer TEXT,
+        model_answer TEXT,
+        similarity REAL,
+        score REAL,
+        max_marks REAL,
+        FOREIGN KEY(evaluation_id) REFERENCES evaluations(id))''')
+    conn.commit()
+
+def dedupe_evaluations(conn):
+    """Keep only the latest evaluation per (roll_no, subject), with its question results"""
+    stale = '''SELECT id FROM evaluations e WHERE EXISTS (
+        SELECT 1 FROM evaluations newer
+        WHERE newer.roll_no = e.roll_no AND newer.subject = e.subject
+          AND (COALESCE(newer.timestamp, '') > COALESCE(e.timestamp, '')
+               OR (COALESCE(newer.timestamp, '') = COALESCE(e.timestamp, '') AND newer.id > e.id)))'''
+    conn.execute(f'DELETE FROM question_results WHERE evaluation_id IN ({stale})')
+    conn.execute(f'DELETE FROM evaluations WHERE id IN ({stale})')
+
+def add_report_indexes(conn):
+    # Build the lookup index first so removing duplicates doesn't scan the table per row
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_evaluations_roll_subject_time ON evaluations(roll_no, subject, timestamp)')
+    dedupe_evaluations(conn)
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS uq_evaluations_roll_subject ON evaluations(roll_no, subject)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_evaluations_time ON evaluations(timestamp, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_evaluations_subject_time ON evaluations(subject, timestamp, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_question_results_evaluation ON question_results(evaluation_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_students_department ON students(department, roll_no)')
+
+def add_summary_tables(conn):
+    create_summary_tables(conn)
+    rebuild_summaries(conn)
+
+def add_data_version(conn):
+    """Single-row counter that moves on every change to graded results; see bump_data_version"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL,
+        changed_at REAL NOT NULL)''')
+    conn.execute(f"INSERT OR IGNORE INTO data_version VALUES (1, 1, {NOW_SQL})")
+
+def cascade_question_results(conn):
+    """Rebuild question_results with ON DELETE CASCADE, leaving behind rows whose evaluation is gone"""
+    # A copy left by an interrupted run would make CREATE TABLE fail
+    conn.execute('DROP TABLE IF EXISTS question_results_new')
+    conn.execute('''CREATE TABLE question_results_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        evaluation_id INTEGER NOT NULL,
+        question TEXT,
+        student_answer TEXT,
+        model_answer TEXT,
+        similarity REAL,
+        score REAL,
+        max_marks REAL,
+        FOREIGN KEY(evaluation_id) REFERENCES evaluations(id) ON DELETE CASCADE)''')
+    conn.execute('''INSERT INTO question_results_new
+        SELECT q.* FROM question_results q WHERE q.evaluation_id IN (SELECT id FROM evaluations)''')
+    conn.execute('DROP TABLE question_results')
+    conn.execute('ALTER TABLE question_results_new RENAME TO question_results')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_question_results_evaluation ON question_results(evaluation_id)')
+
+def add_stage_timings(conn):
+    # JSON {stage: seconds} recorded while grading the script
+    conn.execute('ALTER TABLE evaluations ADD COLUMN stage_timings TEXT')
+
+def add_choice_rule(conn):
+    # Optional-question rule the script was graded with, e.g. '1/2, 3/4'; re-grading reuses it
+    conn.execute('ALTER TABLE evaluations ADD COLUMN choice_rule TEXT')
+
+def drop_version_triggers(conn):
+    # Per-row triggers bumped data_version for every question row and cascaded delete;
+    # the writers in persistence.py and regrade.py now bump it once per write instead
+    for table in ("evaluations", "question_results"):
+        for event in ("insert", "update", "delete"):
+            conn.execute(f'DROP TRIGGER IF EXISTS bump_version_{table}_{event}')
+
+# Schema changes in order; PRAGMA user_version records how many have been applied
+MIGRATIONS = [
+    add_report_indexes,
+    add_summary_tables,
+    add_data_version,
+    cascade_question_results,
+    add_stage_timings,
+    add_choice_rule,
+    drop_version_triggers,
+]
+
+def migrate(conn):
+    """Apply pending migrations, then refresh planner statistics.
+
+    Each migration and its user_version bump run between an explicit BEGIN
+    and COMMIT, so schema statements (which sqlite3 would otherwise run
+    outside a transaction) are rolled back with the rest if it fails.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute('BEGIN')
+        try:
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        print(f"Applied migration {number}: {migration.__name__}")
+    if version < len(MIGRATIONS):
+        conn.execute('ANALYZE')
+        conn.commit()
+    return len(MIGRATIONS) - version
+
+def compact_database(conn):
+    """Delete question results left without an evaluation, then VACUUM; returns the rows removed"""
+    with conn:
+        removed = conn.execute(
+            'DELETE FROM question_results WHERE evaluation_id NOT IN (SELECT id FROM evaluations)').rowcount
+    conn.execute('VACUUM')
+    # In WAL mode the shrunken pages reach the main file at a checkpoint
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return removed
+
+def bump_data_version(conn):
+    """Mark graded results as changed; call once per write, inside its transaction"""
+    conn.execute(f'UPDATE data_version SET version = version + 1, changed_at = {NOW_SQL} WHERE id = 1')
+
+def data_version(conn):
+    """(version, changed_at) of the graded data; both move whenever results change"""
+    row = conn.execute('SELECT version, changed_at FROM data_version WHERE id = 1').fetchone()
+    return row[0], row[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain evaluations.db")
+    parser.add_argument("command", choices=["migrate", "compact"])
+    parser.add_argument("--database", default=DATABASE)
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    try:
+        # A fresh database gets the base tables first, so migrate also initializes
+        create_tables(conn)
+        if args.command == "migrate":
+            print(f"{migrate(conn)} migrations applied.")
+        else:
+            migrate(conn)
+            size_before = os.path.getsize(args.database)
+            removed = compact_database(conn)
+            print(f"Removed {removed} orphaned question results; "
+                  f"{size_before} -> {os.path.getsize(args.database)} bytes.")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+from functools import lru_cache
+
+import fitz
+from PIL import Image
+
+from cache import file_digest
+from metrics import span
+from segmentation import PAGE_BREAK
+
+def render_page(page, dpi=200, grayscale=True):
+    """Rasterize one PyMuPDF page into a PIL image"""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY if grayscale else fitz.csRGB, alpha=False)
+    return Image.frombytes("L" if grayscale else "RGB", (pix.width, pix.height), pix.samples)
+
+class PDFDocument:
+    """A PDF parsed once: page text layers up front, page images rendered on demand.
+
+    Shared by mark extraction and answer extraction so each upload is opened
+    and hashed a single time per process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._digest = None
+        self._lines = None
+        with fitz.open(path) as doc:
+            self.page_count = doc.page_count
+            self.page_texts = [page.get_text("text") for page in doc]
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = file_digest(self.path)
+        return self._digest
+
+    @property
+    def text(self):
+        return PAGE_BREAK.join(self.page_texts)
+
+    @property
+    def lines(self):
+        """Non-empty, stripped lines of the text layer across all pages"""
+        if self._lines is None:
+            self._lines = [line.strip() for line in self.text.split('\n') if line.strip()]
+        return self._lines
+
+    def page_image(self, page_number, dpi=200, grayscale=True):
+        with fitz.open(self.path) as doc:
+            return render_page(doc[page_number - 1], dpi, grayscale)
+
+    def iter_page_images(self, dpi=200, grayscale=True, page_numbers=None):
+        """Yield (page_number, image) one page at a time so only one page is held in memory"""
+        wanted = set(page_numbers) if page_numbers is not None else None
+        with fitz.open(self.path) as doc:
+            for index, page in enumerate(doc):
+                if wanted is None or index + 1 in wanted:
+                    yield index + 1, render_page(page, dpi, grayscale)
+
+@lru_cache(maxsize=64)
+@span("pdf_parse")
+def _load_document(path, mtime_ns, size):
+    return PDFDocument(path)
+
+def load_document(path):
+    """Parsed PDFDocument for `path`, reused until the file changes on disk"""
+    stat = os.stat(path)
+    return _load_document(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,104 @@
+import os
+import threading
+
+import numpy as np
+
+# Which backend and model embed answers; see BACKENDS for the options
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "paraphrase-mpnet-base-v2")
+# Optional ONNX file inside the model repo, e.g. "onnx/model_qint8_avx512_vnni.onnx"
+EMBEDDING_ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE", "")
+
+class SentenceTransformerBackend:
+    """Full-precision sentence-transformers model run through PyTorch"""
+
+    name = "torch"
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.model = None
+
+    @property
+    def cache_name(self):
+        """Identifies the embedding space in the embedding cache key"""
+        if self.name == "torch":
+            return self.model_name
+        return f"{self.model_name}:{self.name}"
+
+    def load(self, **kwargs):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name, **kwargs)
+
+    def encode(self, texts, batch_size=32):
+        if self.model is None:
+            self.model = self.load()
+        return np.asarray(self.model.encode(list(texts), batch_size=batch_size), dtype=np.float32)
+
+class QuantizedTorchBackend(SentenceTransformerBackend):
+    """Same model with its Linear layers dynamically quantized to int8 for CPU inference"""
+
+    name = "torch-int8"
+
+    def load(self):
+        import torch
+        # Dynamic int8 quantization only runs on CPU
+        model = super().load(device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+class ONNXBackend(SentenceTransformerBackend):
+    """ONNX Runtime backend; point EMBEDDING_ONNX_FILE at a quantized export to run int8"""
+
+    name = "onnx"
+
+    def __init__(self, model_name=EMBEDDING_MODEL, onnx_file=EMBEDDING_ONNX_FILE):
+        super().__init__(model_name)
+        self.onnx_file = onnx_file
+
+    @property
+    def cache_name(self):
+        return f"{self.model_name}:onnx:{self.onnx_file or 'model.onnx'}"
+
+    def load(self):
+        model_kwargs = {"file_name": self.onnx_file} if self.onnx_file else None
+        return super().load(backend="onnx", model_kwargs=model_kwargs)
+
+class RemoteBackend:
+    """Encodes through the shared model service (model_service.py), so this process loads no model"""
+
+    name = "remote"
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        # The service decides which model runs; model_name is only accepted for a uniform constructor
+        self.model_name = model_name
+        self.model = None
+        self.client = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        with self.lock:
+            if self.model is None:
+                from model_service import ModelServiceClient
+                self.client = ModelServiceClient()
+                # Cache keys use the service's embedding space, shared with in-process backends
+                self.model = self.client.info()
+        return self.client
+
+    @property
+    def cache_name(self):
+        self.connect()
+        return self.model["cache_name"]
+
+    def encode(self, texts, batch_size=32):
+        return np.asarray(self.connect().encode(texts, batch_size), dtype=np.float32)
+
+BACKENDS = {
+    "torch": SentenceTransformerBackend,
+    "torch-int8": QuantizedTorchBackend,
+    "onnx": ONNXBackend,
+    "remote": RemoteBackend,
+}
+
+def create_backend(name=EMBEDDING_BACKEND, model_name=EMBEDDING_MODEL):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {name!r}; choose one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_name)
@@ -1,128 +1,159 @@
-from sentence_transformers import SentenceTransformer, util
 from utils import extract_text_from_pdf, extract_text_from_handwritten_pdf, extract_text_from_scanned_pdf, extract_answers
-import re
-
-model = SentenceTransformer("paraphrase-mpnet-base-v2")
+from cache import EmbeddingCache, text_key
+from embedding_backends import create_backend
+from scoring import apply_scores, build_paper, plan_answers
+from ocr_correction import correct_text
+from metrics import span
+from batching import MicroBatcher
+import numpy as np
+import os
+import threading
+
+# The backend (and torch) load on first use, so report-only processes never pay for them
+_backend = None
+_backend_lock = threading.Lock()
+
+# Model-answer embeddings are reused across every student in a subject
+embedding_cache = EmbeddingCache()
+
+# Number of texts encoded per forward pass when scoring in bulk
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "32"))
+# Encode calls from concurrent evaluations are merged for up to EMBED_BATCH_WAIT_MS,
+# or until EMBED_MAX_BATCH texts are queued; a wait of 0 encodes each call on its own
+EMBED_BATCH_WAIT_MS = float(os.environ.get("EMBED_BATCH_WAIT_MS", "3"))
+EMBED_MAX_BATCH = int(os.environ.get("EMBED_MAX_BATCH", "128"))
+
+def get_backend():
+    """The configured embedding backend; its model loads on the first encode"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+def encode_direct(texts, batch_size=EMBED_BATCH_SIZE):
+    """One forward pass through the backend, without waiting for other callers"""
+    backend = get_backend()
+    # Serialize the first call so concurrent requests don't load the model twice
+    if backend.model is None:
+        with _backend_lock:
+            return backend.encode(texts, batch_size)
+    return backend.encode(texts, batch_size)
+
+encode_batcher = MicroBatcher(encode_direct, EMBED_BATCH_WAIT_MS, EMBED_MAX_BATCH, "evaluator")
+
+@span("encode")
+def encode(texts, batch_size=EMBED_BATCH_SIZE):
+    """Embed texts into a float32 (n, dim) matrix, sharing a forward pass with concurrent callers"""
+    if EMBED_BATCH_WAIT_MS <= 0:
+        return encode_direct(texts, batch_size)
+    return encode_batcher.encode(texts, batch_size)
+
+def warm_up():
+    """Load the model and run one encode so the first real request isn't slow"""
+    encode(["warm up"])
+
+def pairwise_cosine(emb1, emb2):
+    """Row-wise cosine similarity of two (n, dim) embedding matrices"""
+    emb1 = np.asarray(emb1, dtype=np.float32)
+    emb2 = np.asarray(emb2, dtype=np.float32)
+    norms = np.linalg.norm(emb1, axis=1) * np.linalg.norm(emb2, axis=1)
+    return np.einsum('ij,ij->i', emb1, emb2) / np.maximum(norms, 1e-8)
 
 def correct_ocr_text(student_text, model_answer):
     """Basic OCR error correction using model answer as reference"""
-    corrections = {
-        r'\+ake': 'make',
-        r'teh': 'the',
-        r'adn': 'and',
-        r'wih': 'with',
-        r'[l1]ike': 'like'
-    }
-    
-    for pattern, replacement in corrections.items():
-        student_text = re.sub(pattern, replacement, student_text, flags=re.IGNORECASE)
-    
-    return student_text
+    return correct_text(student_text, model_answer)
 
 def evaluate_similarity(student_answer, model_answer):
-    emb1 = model.encode(student_answer, convert_to_tensor=True)
-    emb2 = model.encode(model_answer, convert_to_tensor=True)
-    similarity = util.pytorch_cos_sim(emb1, emb2).item()
+    embeddings = encode([student_answer, model_answer])
+    similarity = float(pairwise_cosine(embeddings[:1], embeddings[1:])[0])
     return round(similarity * 100, 2)
 
-def evaluate_pdfs(student_pdf, model_pdf, max_marks):
+def encode_model_answers(texts, batch_size=EMBED_BATCH_SIZE):
+    """Embed model answers, reading and filling the on-disk embedding cache"""
+    cache_name = get_backend().cache_name
+    keys = {text: text_key(text, cache_name) for text in texts}
+    cached = embedding_cache.get_many(keys.values())
+    vectors = {text: cached[key] for text, key in keys.items() if key in cached}
+
+    missing = [text for text in texts if text not in vectors]
+    if missing:
+        encoded = encode(missing, batch_size)
+        vectors.update(zip(missing, encoded))
+        embedding_cache.put_many(cache_name, {keys[text]: vectors[text] for text in missing})
+    return vectors
+
+def evaluate_similarity_batch(pairs, batch_size=EMBED_BATCH_SIZE):
+    """Score many (student_answer, model_answer) pairs with a single batched encode"""
+    if not pairs:
+        return []
+
+    # Encode each distinct text once; model answers repeat across scripts
+    vectors = encode_model_answers(list(dict.fromkeys(m for _, m in pairs)), batch_size)
+    student_texts = [text for text in dict.fromkeys(s for s, _ in pairs) if text not in vectors]
+    if student_texts:
+        vectors.update(zip(student_texts, encode(student_texts, batch_size)))
+
+    emb1 = np.vstack([vectors[student] for student, _ in pairs])
+    emb2 = np.vstack([vectors[model_ans] for _, model_ans in pairs])
+    similarities = pairwise_cosine(emb1, emb2).tolist()
+    return [round(similarity * 100, 2) for similarity in similarities]
+
+@span("ocr_correction")
+def select_answers(paper, student_answers, model_answers):
+    """Pick the answers to grade from the paper structure and correct their OCR text"""
+    selected = plan_answers(paper, student_answers)
+    for item in selected:
+        model_answer = model_answers.get(item["key"], "")
+        item["student_answer"] = correct_ocr_text(student_answers[item["key"]], model_answer)
+        item["model_answer"] = model_answer
+    return selected
+
+@span("model_answers")
+def load_model_answers(model_pdf):
+    """Read and split a model answer PDF (assumed scanned) into answers"""
+    return extract_answers(extract_text_from_scanned_pdf(model_pdf))
+
+def score_scripts(student_answer_sets, model_answers, max_marks, choice_rule=None):
+    """Score several scripts against one answer key in a single batched pass.
+
+    `choice_rule` describes optional questions, e.g. '1/2, 3/4' or
+    'any 5 of 1-8' (see scoring.parse_choice_rule).
+    Returns a list of (results, total_marks), one per answer set.
+    """
+    paper = build_paper(max_marks, model_answers, choice_rule)
+    selections = [select_answers(paper, student_answers, model_answers)
+                  for student_answers in student_answer_sets]
+
+    pairs = [(item["student_answer"], item["model_answer"])
+             for selected in selections for item in selected]
+    similarities = evaluate_similarity_batch(pairs)
+
+    evaluated = []
+    offset = 0
+    with span("scoring"):
+        for selected in selections:
+            evaluated.append(apply_scores(selected, similarities[offset:offset + len(selected)]))
+            offset += len(selected)
+    return evaluated
+
+def evaluate_pdfs(student_pdf, model_pdf, max_marks, choice_rule=None):
     # Use Gemini for student answers
     student_text = extract_text_from_handwritten_pdf(student_pdf)
     print(student_text)
     # Use pytesseract for model answers (assuming they might be scanned)
-    model_text = extract_text_from_scanned_pdf(model_pdf)
-
-    student_answers = extract_answers(student_text)
-    model_answers = extract_answers(model_text)
-
-    results = []
-    total_marks = 0
-
-    student_question_numbers = list(student_answers.keys()) # Get the keys of the students answer dict.
-
-    # Handle unit completion logic
-    processed_units = set()
-    for q_num, model_ans in model_answers.items():
-        unit_num = q_num[0] # Extract the unit number (e.g., '1' from '1a')
-
-        if unit_num in processed_units:
-            continue # Skip if unit is already processed
-
-        # Check if both 'a' and 'b' are answered
-        a_part = f"{unit_num}a"
-        b_part = f"{unit_num}b"
-
-        if a_part in student_question_numbers and b_part in student_question_numbers:
-            # Both parts are answered, evaluate them
-            question_max_a = max_marks.get(a_part, 7)
-            student_ans_a = student_answers.get(a_part, "No answer provided.")
-            corrected_ans_a = correct_ocr_text(student_ans_a, model_answers.get(a_part, ""))
-            similarity_a = evaluate_similarity(corrected_ans_a, model_answers.get(a_part, ""))
-            score_a = round((similarity_a / 100) * question_max_a, 2)
-            total_marks += score_a
-
-            results.append({
-                "question": f"Q{a_part}",
-                "max_marks": question_max_a,
-                "score": score_a,
-                "similarity": similarity_a,
-                "student_answer": corrected_ans_a,
-                "model_answer": model_answers.get(a_part, "")
-            })
-
-            question_max_b = max_marks.get(b_part, 7)
-            student_ans_b = student_answers.get(b_part, "No answer provided.")
-            corrected_ans_b = correct_ocr_text(student_ans_b, model_answers.get(b_part, ""))
-            similarity_b = evaluate_similarity(corrected_ans_b, model_answers.get(b_part, ""))
-            score_b = round((similarity_b / 100) * question_max_b, 2)
-            total_marks += score_b
-
-            results.append({
-                "question": f"Q{b_part}",
-                "max_marks": question_max_b,
-                "score": score_b,
-                "similarity": similarity_b,
-                "student_answer": corrected_ans_b,
-                "model_answer": model_answers.get(b_part, "")
-            })
-
-            processed_units.add(unit_num) # Mark unit as processed
-        else:
-            # Handle cases where only 'a' or 'b' is answered
-            if a_part in student_question_numbers:
-                question_max_a = max_marks.get(a_part, 7)
-                student_ans_a = student_answers.get(a_part, "No answer provided.")
-                corrected_ans_a = correct_ocr_text(student_ans_a, model_answers.get(a_part, ""))
-                similarity_a = evaluate_similarity(corrected_ans_a, model_answers.get(a_part, ""))
-                score_a = round((similarity_a / 100) * question_max_a, 2)
-                total_marks += score_a
-
-                results.append({
-                    "question": f"Q{a_part}",
-                    "max_marks": question_max_a,
-                    "score": score_a,
-                    "similarity": similarity_a,
-                    "student_answer": corrected_ans_a,
-                    "model_answer": model_answers.get(a_part, "")
-                })
-                processed_units.add(unit_num)
-
-            if b_part in student_question_numbers:
-                question_max_b = max_marks.get(b_part, 7)
-                student_ans_b = student_answers.get(b_part, "No answer provided.")
-                corrected_ans_b = correct_ocr_text(student_ans_b, model_answers.get(b_part, ""))
-                similarity_b = evaluate_similarity(corrected_ans_b, model_answers.get(b_part, ""))
-                score_b = round((similarity_b / 100) * question_max_b, 2)
-                total_marks += score_b
-
-                results.append({
-                    "question": f"Q{b_part}",
-                    "max_marks": question_max_b,
-                    "score": score_b,
-                    "similarity": similarity_b,
-                    "student_answer": corrected_ans_b,
-                    "model_answer": model_answers.get(b_part, "")
-                })
-                processed_units.add(unit_num)
-
-    return results, round(total_marks, 2)
\ No newline at end of file
+    model_answers = load_model_answers(model_pdf)
+
+    return score_scripts([extract_answers(student_text)], model_answers, max_marks, choice_rule)[0]
+
+def evaluate_pdfs_batch(student_pdfs, model_pdf, max_marks, choice_rule=None):
+    """Evaluate several student scripts against one model answer.
+
+    The model answer is read once and every answer pair across all scripts
+    is scored in one batched encode. Returns a list of (results, total_marks).
+    """
+    model_answers = load_model_answers(model_pdf)
+    student_answer_sets = [extract_answers(extract_text_from_handwritten_pdf(student_pdf))
+                           for student_pdf in student_pdfs]
+    return score_scripts(student_answer_sets, model_answers, max_marks, choice_rule)
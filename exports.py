@@ -0,0 +1,117 @@
+"""Constant-memory exports of the class performance report.
+
+Rows come straight off a SQLite cursor, one student at a time, and are
+written as CSV chunks, into a write-only XLSX workbook or into Parquet
+row groups. Only one student's row and one output chunk are held in
+memory at any point.
+"""
+import csv
+import io
+import itertools
+import os
+import tempfile
+
+# Rows written per CSV chunk or Parquet row group, and bytes per streamed file chunk
+EXPORT_BATCH_ROWS = int(os.environ.get("EXPORT_BATCH_ROWS", "1000"))
+EXPORT_CHUNK_BYTES = int(os.environ.get("EXPORT_CHUNK_BYTES", str(256 * 1024)))
+
+EXPORT_FORMATS = {
+    "xlsx": ("student_performance_report.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("student_performance_report.csv", "text/csv"),
+    "parquet": ("student_performance_report.parquet", "application/vnd.apache.parquet"),
+}
+
+def report_columns(subjects):
+    columns = ["Roll No", "Student Name"]
+    for subject in subjects:
+        columns += [f"{subject} Grade", f"{subject} GPA", f"{subject} Credits"]
+    return columns + ["Final GPA"]
+
+def report_rows(db):
+    """Yield the header, then one pivoted row per student, reading evaluations in roll-number order"""
+    subjects = [row[0] for row in db.execute('SELECT subject FROM subject_summary ORDER BY subject')]
+    position = {subject: index for index, subject in enumerate(subjects)}
+    yield report_columns(subjects)
+
+    cursor = db.execute('''
+        SELECT e.roll_no, s.full_name, e.subject, e.grade, e.grade_point, e.credits, g.gpa as final_gpa
+        FROM evaluations e
+        LEFT JOIN students s ON e.roll_no = s.roll_no
+        LEFT JOIN student_summary g ON e.roll_no = g.roll_no
+        ORDER BY e.roll_no
+    ''')
+    for roll_no, rows in itertools.groupby(cursor, key=lambda row: row[0]):
+        values = [""] * (3 * len(subjects))
+        full_name = final_gpa = None
+        for _, name, subject, grade, grade_point, credits, gpa in rows:
+            full_name, final_gpa = name, gpa
+            index = position.get(subject)
+            if index is None:
+                continue
+            values[3 * index:3 * index + 3] = [grade, round(grade_point or 0.0, 2), credits]
+        yield [roll_no, full_name or ""] + values + [round(final_gpa or 0.0, 2)]
+
+def iter_csv(rows):
+    """Encode rows as CSV, yielding bytes every EXPORT_BATCH_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for batch in iter(lambda: list(itertools.islice(rows, EXPORT_BATCH_ROWS)), []):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+def write_xlsx(rows, path):
+    """Write rows with openpyxl's write-only mode, which spools sheet data to disk"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Student Report")
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+def write_parquet(rows, path):
+    """Write rows as Parquet row groups; needs the optional pyarrow package"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = next(rows)
+    # Grade columns hold text, GPA and credit columns numbers; mixed blanks are stored as nulls
+    types = [pa.string(), pa.string()]
+    for column in columns[2:]:
+        types.append(pa.string() if column.endswith(" Grade") else pa.float64())
+    schema = pa.schema(list(zip(columns, types)))
+
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in iter(lambda: list(itertools.islice(rows, EXPORT_BATCH_ROWS)), []):
+            data = [[None if value == "" else value for value in column] for column in zip(*batch)]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=kind) for values, kind in zip(data, types)], schema=schema))
+
+def stream_file(path, remove=True):
+    """Yield a file in EXPORT_CHUNK_BYTES chunks, deleting it once fully sent"""
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(EXPORT_CHUNK_BYTES), b""):
+                yield chunk
+    finally:
+        if remove:
+            os.remove(path)
+
+def export_report(db, fmt):
+    """Body generator for the report in `fmt`. XLSX and Parquet are built in a temp file first."""
+    rows = report_rows(db)
+    if fmt == "csv":
+        return iter_csv(rows)
+    writers = {"xlsx": write_xlsx, "parquet": write_parquet}
+    if fmt not in writers:
+        raise ValueError(f"Unknown export format {fmt!r}; choose one of {', '.join(EXPORT_FORMATS)}")
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        writers[fmt](rows, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return stream_file(path)
@@ -0,0 +1,144 @@
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_REQUESTS_PER_MINUTE = float(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_SECONDS = float(os.environ.get("GEMINI_BACKOFF_SECONDS", "1.0"))
+
+# Errors worth retrying: rate limits, overload and timeouts
+TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
+
+class TokenBucket:
+    """Blocking token-bucket limiter: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+class GeminiClient:
+    """Shared Gemini access with bounded concurrency, rate limiting, retries and metrics.
+
+    Pass `model` (anything with generate_content) to run against a fake or
+    local stub instead of the real API.
+    """
+
+    def __init__(self, model=None, model_name=GEMINI_MODEL, max_concurrency=4,
+                 requests_per_minute=GEMINI_REQUESTS_PER_MINUTE, max_retries=GEMINI_MAX_RETRIES,
+                 backoff_seconds=GEMINI_BACKOFF_SECONDS, sleep=time.sleep):
+        self.model = model
+        self.model_name = model_name
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.sleep = sleep
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_minute / 60.0, sleep=sleep)
+        self.lock = threading.Lock()
+        # Request latencies count from when a concurrency slot is free; time spent waiting for one is kept apart
+        self.latencies = deque(maxlen=1000)
+        self.queue_waits = deque(maxlen=1000)
+        self.counts = Counter()
+        self.fallbacks_by_page = Counter()
+
+    def get_model(self):
+        with self.lock:
+            if self.model is None:
+                self.model = genai.GenerativeModel(self.model_name)
+        return self.model
+
+    def generate(self, parts):
+        """Send one request, retrying transient errors with exponential backoff and jitter"""
+        model = self.get_model()
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            queued = time.perf_counter()
+            try:
+                with self.semaphore:
+                    started = time.perf_counter()
+                    self.record_wait(started - queued)
+                    response = model.generate_content(parts)
+                self.record("requests", time.perf_counter() - started)
+                return response.text
+            except TRANSIENT_ERRORS:
+                self.record("transient_errors", time.perf_counter() - started)
+                if attempt == self.max_retries:
+                    raise
+                self.count("retries")
+                self.sleep(self.backoff_seconds * (2 ** attempt) * (1 + random.random() * 0.1))
+            except Exception:
+                self.record("errors", time.perf_counter() - started)
+                raise
+
+    def record(self, counter, seconds):
+        with self.lock:
+            self.counts[counter] += 1
+            self.latencies.append(seconds)
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.queue_waits.append(seconds)
+
+    def count(self, counter):
+        with self.lock:
+            self.counts[counter] += 1
+
+    def record_fallback(self, page_number):
+        """Note that a page was sent to Tesseract because Gemini failed"""
+        with self.lock:
+            self.counts["fallbacks"] += 1
+            self.fallbacks_by_page[page_number] += 1
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            queue_waits = sorted(self.queue_waits)
+            counts = dict(self.counts)
+            by_page = dict(sorted(self.fallbacks_by_page.items()))
+
+        def percentile(p, values=latencies):
+            return round(values[min(len(values) - 1, int(p * len(values)))], 4) if values else 0.0
+
+        return {
+            "requests": counts.get("requests", 0),
+            "transient_errors": counts.get("transient_errors", 0),
+            "errors": counts.get("errors", 0),
+            "retries": counts.get("retries", 0),
+            "fallbacks": counts.get("fallbacks", 0),
+            "fallbacks_by_page": by_page,
+            "latency_avg": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+            "queue_wait_avg": round(sum(queue_waits) / len(queue_waits), 4) if queue_waits else 0.0,
+            "queue_wait_p95": percentile(0.95, queue_waits)
+        }
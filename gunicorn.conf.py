@@ -0,0 +1,61 @@
+"""Production serving: gunicorn web workers sharing one embedding model service.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The master migrates the database and starts model_service.py before forking.
+Each worker serves the report, download and upload routes and runs
+JOB_WORKERS grading threads. Those threads encode through the service
+(EMBEDDING_BACKEND=remote), so the model is held in memory once however many
+workers run. Each worker's Tesseract pool gets OCR_WORKERS processes, by
+default the CPUs divided between the workers. The service's authkey is generated at startup unless
+MODEL_SERVICE_AUTHKEY is set. Set START_MODEL_SERVICE=0 to use a service
+started elsewhere, at MODEL_SERVICE_ADDRESS with the same MODEL_SERVICE_AUTHKEY.
+"""
+import os
+import secrets
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Workers import the app after the fork and pick this up; the service keeps its own backend
+os.environ.setdefault("EMBEDDING_BACKEND", "remote")
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_WORKERS", str(min(8, 2 * (os.cpu_count() or 1) + 1))))
+threads = int(os.environ.get("WEB_THREADS", "4"))
+# Each worker has its own Tesseract process pool; split the CPUs between them instead of
+# starting a full-size pool in every worker
+os.environ.setdefault("OCR_WORKERS", str(max(1, (os.cpu_count() or 1) // workers)))
+# Exports and bulk uploads can hold a request for a while
+timeout = int(os.environ.get("WEB_TIMEOUT", "300"))
+
+START_MODEL_SERVICE = os.environ.get("START_MODEL_SERVICE", "1") == "1"
+MODEL_SERVICE_START_TIMEOUT = float(os.environ.get("MODEL_SERVICE_START_TIMEOUT", "300"))
+
+_model_service = None
+
+def on_starting(server):
+    global _model_service
+    if START_MODEL_SERVICE and not os.environ.get("MODEL_SERVICE_AUTHKEY"):
+        # A fresh secret per run, inherited by the service and by every worker forked after this
+        os.environ["MODEL_SERVICE_AUTHKEY"] = secrets.token_bytes(32).hex()
+    # Migrate once, in a separate process, so no SQLite connection is inherited across the fork
+    subprocess.run([sys.executable, os.path.join(ROOT, "database.py"), "migrate"], cwd=ROOT, check=True)
+
+    from model_service import wait_until_ready
+
+    if START_MODEL_SERVICE:
+        _model_service = subprocess.Popen([sys.executable, os.path.join(ROOT, "model_service.py")], cwd=ROOT)
+    if not wait_until_ready(timeout=MODEL_SERVICE_START_TIMEOUT):
+        raise RuntimeError("Model service did not become ready")
+    server.log.info("Model service ready")
+
+def post_worker_init(worker):
+    from app import start_job_workers
+    start_job_workers()
+
+def on_exit(server):
+    if _model_service is not None:
+        _model_service.terminate()
+        _model_service.wait(timeout=30)
@@ -0,0 +1,162 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+# Jobs are stored alongside the evaluations so they survive a restart
+JOBS_DATABASE = os.environ.get("JOBS_DATABASE", "evaluations.db")
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+# A running job whose worker has not reported for this long is picked up again
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "600"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# How often a running job renews its lease, independent of progress reports
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", str(max(1, JOB_LEASE_SECONDS // 4))))
+
+class JobQueue:
+    """Persistent FIFO of evaluation jobs backed by a SQLite table"""
+
+    def __init__(self, path=JOBS_DATABASE):
+        self.path = path
+        with self.connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                stage TEXT,
+                progress INTEGER DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER DEFAULT 0,
+                created_at REAL,
+                updated_at REAL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)')
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, kind, payload):
+        now = time.time()
+        with self.connect() as conn:
+            return conn.execute(
+                'INSERT INTO jobs (kind, payload, status, stage, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (kind, json.dumps(payload), 'queued', 'queued', now, now)).lastrowid
+
+    def claim(self):
+        """Atomically take the oldest queued job, or a running job whose lease expired"""
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('''SELECT * FROM jobs
+                WHERE status = 'queued' OR (status = 'running' AND updated_at < ?)
+                ORDER BY id LIMIT 1''', (now - JOB_LEASE_SECONDS,)).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            if row['attempts'] >= JOB_MAX_ATTEMPTS:
+                conn.execute("UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                             ('Gave up after repeated interrupted attempts', now, row['id']))
+                conn.commit()
+                return None
+            conn.execute('''UPDATE jobs SET status = 'running', stage = 'starting', attempts = attempts + 1,
+                updated_at = ? WHERE id = ?''', (now, row['id']))
+            conn.commit()
+            return {"id": row['id'], "kind": row['kind'], "payload": json.loads(row['payload'])}
+
+    def set_progress(self, job_id, stage, progress):
+        with self.connect() as conn:
+            conn.execute('UPDATE jobs SET stage = ?, progress = ?, updated_at = ? WHERE id = ?',
+                         (stage, progress, time.time(), job_id))
+
+    def heartbeat(self, job_id):
+        with self.connect() as conn:
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def complete(self, job_id, result):
+        with self.connect() as conn:
+            conn.execute('''UPDATE jobs SET status = 'done', stage = 'done', progress = 100, result = ?,
+                updated_at = ? WHERE id = ?''', (json.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        with self.connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                         (error, time.time(), job_id))
+
+    def get(self, job_id):
+        with self.connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload']) if job['payload'] else None
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def depth(self):
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+@contextmanager
+def keep_lease(queue, job_id, interval=JOB_HEARTBEAT_SECONDS):
+    """Renew a job's lease from a background thread while the body runs.
+
+    Stages such as OCR and encoding can run longer than JOB_LEASE_SECONDS
+    without reporting progress, and another worker would then claim the job.
+    """
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            try:
+                queue.heartbeat(job_id)
+            except sqlite3.Error as e:
+                print(f"Job {job_id} heartbeat failed: {e}")
+
+    thread = threading.Thread(target=beat, name=f"job-heartbeat-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def run_job(queue, job, handlers):
+    """Run one claimed job through the handler registered for its kind"""
+    handler = handlers.get(job['kind'])
+    if handler is None:
+        queue.fail(job['id'], f"No handler for job kind {job['kind']!r}")
+        return
+    try:
+        with keep_lease(queue, job['id']):
+            result = handler(job['payload'], lambda stage, progress: queue.set_progress(job['id'], stage, progress))
+        queue.complete(job['id'], result)
+    except Exception as e:
+        print(f"Job {job['id']} failed: {e}")
+        traceback.print_exc()
+        queue.fail(job['id'], str(e))
+
+def worker_loop(queue, handlers, stop_event):
+    while not stop_event.is_set():
+        job = queue.claim()
+        if job is None:
+            stop_event.wait(JOB_POLL_INTERVAL)
+            continue
+        run_job(queue, job, handlers)
+
+def start_workers(queue, handlers, count):
+    """Start `count` daemon worker threads; returns the event that stops them"""
+    stop_event = threading.Event()
+    for i in range(count):
+        threading.Thread(target=worker_loop, args=(queue, handlers, stop_event),
+                         name=f"job-worker-{i}", daemon=True).start()
+    return stop_event
@@ -0,0 +1,90 @@
+"""Stage timing spans and Prometheus text-format metrics.
+
+Wrap a pipeline stage in `span("name")`: its duration goes into a
+process-wide histogram and, inside `record_stages()`, into the per-evaluation
+timings that are stored with the evaluation row.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def sample(name, value, **labels):
+    """One exposition line, e.g. name{stage="ocr",le="0.5"} 3"""
+    label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+    return f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+
+class Histogram:
+    """Duration histogram split by one label, rendered with cumulative buckets"""
+
+    def __init__(self, name, help_text, label, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # label value -> [per-bucket counts, sum, count]
+        self.series = {}
+
+    def observe(self, label_value, value):
+        with self.lock:
+            series = self.series.setdefault(label_value, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self.series.items()}
+        for label_value, (counts, total, count) in sorted(snapshot.items()):
+            labels = {self.label: label_value}
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(sample(f"{self.name}_bucket", bucket_count, **labels, le=bound))
+            lines.append(sample(f"{self.name}_bucket", count, **labels, le="+Inf"))
+            lines.append(sample(f"{self.name}_sum", round(total, 6), **labels))
+            lines.append(sample(f"{self.name}_count", count, **labels))
+        return lines
+
+def render_value(name, help_text, kind, values):
+    """A counter or gauge; `values` is a number or {label dict as tuple pairs: number}"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    if isinstance(values, dict):
+        for labels, value in sorted(values.items()):
+            lines.append(sample(name, value, **dict(labels)))
+    else:
+        lines.append(sample(name, values))
+    return lines
+
+stage_seconds = Histogram("grademate_stage_seconds", "Time spent in each pipeline stage.", "stage")
+ocr_page_seconds = Histogram("grademate_ocr_page_seconds", "Time to OCR one page, by engine.", "engine")
+
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+@contextmanager
+def span(stage):
+    """Time a block as `stage`; repeated spans of one stage add up"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        stage_seconds.observe(stage, seconds)
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + seconds, 4)
+
+@contextmanager
+def record_stages():
+    """Collect spans opened in this thread into a {stage: seconds} dict"""
+    timings = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
@@ -0,0 +1,162 @@
+"""Embedding service shared by every web and job worker process.
+
+One process loads the embedding model and answers encode requests over a
+local socket, so adding workers does not add copies of the model. Requests
+that arrive within MODEL_SERVICE_BATCH_WAIT_MS of each other are coalesced
+by a MicroBatcher: their texts are de-duplicated and encoded in one batch.
+
+    MODEL_SERVICE_AUTHKEY=$(openssl rand -hex 32) python model_service.py --address 127.0.0.1:6010
+
+Workers use it with EMBEDDING_BACKEND=remote (see embedding_backends.py).
+"""
+import argparse
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from batching import MicroBatcher
+
+# host:port for TCP on the loopback interface, anything else is a Unix socket path
+MODEL_SERVICE_ADDRESS = os.environ.get("MODEL_SERVICE_ADDRESS", "127.0.0.1:6010")
+# Backend the service itself runs; it can't be "remote"
+MODEL_SERVICE_BACKEND = os.environ.get("MODEL_SERVICE_BACKEND", "torch")
+# How long to wait for more requests to join a batch, and the most texts per batch
+MODEL_SERVICE_BATCH_WAIT_MS = float(os.environ.get("MODEL_SERVICE_BATCH_WAIT_MS", "5"))
+MODEL_SERVICE_MAX_BATCH = int(os.environ.get("MODEL_SERVICE_MAX_BATCH", "256"))
+
+def service_authkey(authkey=None):
+    """Shared secret for the connection handshake, from MODEL_SERVICE_AUTHKEY unless given.
+
+    multiprocessing.connection unpickles every message, so anyone holding
+    the key can run code in the service. There is no default: gunicorn.conf.py
+    generates a random key per run, and a service started by hand needs one
+    exported to it and its workers.
+    """
+    authkey = authkey or os.environ.get("MODEL_SERVICE_AUTHKEY", "")
+    if not authkey:
+        raise RuntimeError("MODEL_SERVICE_AUTHKEY is not set; export a random secret to the service and its workers")
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+class ModelService:
+    """Serves encode requests from one backend, coalescing concurrent requests into batches"""
+
+    def __init__(self, backend, wait_ms=MODEL_SERVICE_BATCH_WAIT_MS, max_batch=MODEL_SERVICE_MAX_BATCH):
+        self.backend = backend
+        self.batcher = MicroBatcher(backend.encode, wait_ms, max_batch, "model_service")
+
+    def encode(self, texts, batch_size=32):
+        return self.batcher.encode(texts, batch_size)
+
+    def stats(self):
+        return self.batcher.stats()
+
+    def handle(self, conn):
+        """Answer one worker connection's requests until it disconnects"""
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                command = message[0]
+                try:
+                    if command == "encode":
+                        reply = self.encode(message[1], message[2])
+                    elif command == "info":
+                        reply = {"backend": self.backend.name, "cache_name": self.backend.cache_name}
+                    elif command == "stats":
+                        reply = self.stats()
+                    else:
+                        raise ValueError(f"Unknown model service command {command!r}")
+                    conn.send(("ok", reply))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    def serve(self, address=MODEL_SERVICE_ADDRESS, authkey=None):
+        with Listener(parse_address(address), authkey=service_authkey(authkey)) as listener:
+            print(f"Model service ({self.backend.cache_name}) listening on {address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # A client that fails the authkey handshake shouldn't stop the service
+                    print(f"Model service rejected a connection: {e}")
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), name="model-service-conn", daemon=True).start()
+
+class ModelServiceClient:
+    """Connection to the model service, one per thread since connections aren't thread-safe"""
+
+    def __init__(self, address=MODEL_SERVICE_ADDRESS, authkey=None):
+        self.address = address
+        self.authkey = service_authkey(authkey)
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = Client(parse_address(self.address), authkey=self.authkey)
+        return conn
+
+    def call(self, *message):
+        """Send one request, reconnecting once if the service was restarted"""
+        for attempt in range(2):
+            try:
+                conn = self.connection()
+                conn.send(message)
+                status, reply = conn.recv()
+                break
+            except (EOFError, OSError):
+                self.local.conn = None
+                if attempt:
+                    raise
+        if status == "error":
+            raise RuntimeError(f"Model service error: {reply}")
+        return reply
+
+    def encode(self, texts, batch_size=32):
+        return self.call("encode", list(texts), batch_size)
+
+    def info(self):
+        return self.call("info")
+
+    def stats(self):
+        return self.call("stats")
+
+def wait_until_ready(address=MODEL_SERVICE_ADDRESS, timeout=300.0):
+    """Block until the service accepts connections; True if it did within `timeout` seconds"""
+    client = ModelServiceClient(address)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            client.info()
+            return True
+        except (OSError, EOFError):
+            time.sleep(0.5)
+    return False
+
+def main():
+    from embedding_backends import EMBEDDING_MODEL, create_backend
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--address", default=MODEL_SERVICE_ADDRESS)
+    parser.add_argument("--backend", default=MODEL_SERVICE_BACKEND)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    args = parser.parse_args()
+
+    if args.backend == "remote":
+        parser.error("the model service must run a local backend, not 'remote'")
+    backend = create_backend(args.backend, args.model)
+    # Load the model before accepting connections so readiness means warm
+    backend.encode(["warm up"])
+    ModelService(backend).serve(args.address)
+
+if __name__ == "__main__":
+    main()
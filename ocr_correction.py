@@ -0,0 +1,225 @@
+import json
+import os
+import re
+from functools import lru_cache
+
+# Regex pattern -> replacement, applied case-insensitively
+DEFAULT_CORRECTIONS = {
+    r'\+ake': 'make',
+    r'teh': 'the',
+    r'adn': 'and',
+    r'wih': 'with',
+    r'[l1]ike': 'like'
+}
+
+# Extra rules are read from this JSON object of {pattern: replacement}, if it exists
+OCR_CORRECTIONS_FILE = os.environ.get("OCR_CORRECTIONS_FILE", "ocr_corrections.json")
+# Snap near-miss words to the model answer's vocabulary (off by default; it can lift scores)
+OCR_VOCAB_CORRECTION = os.environ.get("OCR_VOCAB_CORRECTION", "0") == "1"
+VOCAB_MIN_WORD_LENGTH = 4
+
+WORD_RE = re.compile(r"[A-Za-z]+")
+# First atom of a rule: an escaped char, a character class or a plain literal, not made optional
+FIRST_ATOM_RE = re.compile(r'^(\\[^A-Za-z0-9]|\[[^\]\\]+\]|[^\\\[\](){}.*+?|^$])(?![?*]|\{0)')
+
+def first_chars(pattern):
+    """Characters every match of `pattern` must start with, as class contents, or None if that can't be told simply.
+
+    Only a leading literal or positive character class counts, and only when
+    the pattern has no `|` outside a group or class.
+    """
+    atom = FIRST_ATOM_RE.match(pattern)
+    if not atom or atom.group(1).startswith("[^"):
+        return None
+    depth = 0
+    in_class = escaped = False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char in "()":
+            depth += 1 if char == "(" else -1
+        elif char == "|" and depth == 0:
+            return None
+    first = atom.group(1)
+    if first.startswith("["):
+        return first[1:-1]
+    # Inside the combined class a bare '-' or '^' would turn into a range or a negation
+    return "\\" + first if first in "-^" else first
+
+def numbered_references(pattern):
+    """Numbered backreferences and conditionals in `pattern`, e.g. ['\\1', '(?(2)']"""
+    references = []
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            if not in_class and pattern[i + 1:i + 2].isdigit() and pattern[i + 1] != "0":
+                references.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+            # A ']' straight after '[' or '[^' is a literal member of the class
+            if pattern[i + 1:i + 2] == "^":
+                i += 1
+            if pattern[i + 1:i + 2] == "]":
+                i += 1
+        elif pattern.startswith("(?(", i) and pattern[i + 3:i + 4].isdigit():
+            references.append(pattern[i:i + 4])
+        i += 1
+    return references
+
+def load_corrections(path=OCR_CORRECTIONS_FILE):
+    corrections = dict(DEFAULT_CORRECTIONS)
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            corrections.update(json.load(f))
+    return corrections
+
+class CorrectionRules:
+    """All correction patterns compiled into one alternation, applied in a single pass.
+
+    Replacements may use the rule's own groups (\\1, \\g<name>). Numbered
+    backreferences in patterns are rejected, because group numbers shift once
+    rules are combined; named groups, with (?P=name), work if the names are
+    unique across rules.
+    """
+
+    def __init__(self, corrections):
+        for pattern in corrections:
+            references = numbered_references(pattern)
+            if references:
+                raise ValueError(f"OCR correction rule {pattern!r} uses numbered group references "
+                                 f"({', '.join(references)}); use a named group and (?P=name) instead")
+        # Each rule is wrapped in one outer group, so match.lastindex names the rule that matched
+        alternation = "|".join(f"({pattern})" for pattern in corrections)
+        # A lookahead on the possible first characters lets the scanner skip most positions quickly;
+        # any rule whose first character can't be read off simply leaves the plain alternation
+        starts = [first_chars(pattern) for pattern in corrections]
+        if starts and all(start is not None for start in starts):
+            alternation = f"(?=[{''.join(starts)}])(?:{alternation})"
+        try:
+            self.pattern = re.compile(alternation, re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"OCR correction rules can't be combined ({e}); group names must be unique across rules")
+        # Outer group number -> (the rule on its own, its replacement)
+        self.group_replacements = {}
+        group = 1
+        for pattern, replacement in corrections.items():
+            rule = re.compile(pattern, re.IGNORECASE)
+            self.group_replacements[group] = (rule, replacement)
+            group += 1 + rule.groups
+
+    def replace(self, match):
+        rule, replacement = self.group_replacements[match.lastindex]
+        if "\\" not in replacement:
+            return replacement
+        # Templates refer to the rule's own groups, so expand against the rule matched on its own;
+        # at the same position it takes the same path it took inside the alternation
+        return rule.match(match.string, match.start()).expand(replacement)
+
+    def apply(self, text):
+        if not self.group_replacements:
+            return text
+        return self.pattern.sub(self.replace, text)
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, giving up early once it must exceed `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class BKTree:
+    """Burkhard-Keller tree for fast edit-distance lookups over a vocabulary"""
+
+    def __init__(self, words):
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0], len(word) + len(node[0]))
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """Words within max_distance, as sorted (distance, word) pairs"""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            candidate, children = stack.pop()
+            distance = edit_distance(word, candidate, max_distance + len(word) + len(candidate))
+            if distance <= max_distance:
+                found.append((distance, candidate))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(found)
+
+@lru_cache(maxsize=256)
+def vocabulary_index(model_answer):
+    """Vocabulary and BK-tree of a model answer; cached because keys are shared by a whole class"""
+    vocabulary = {word.lower() for word in WORD_RE.findall(model_answer) if len(word) >= VOCAB_MIN_WORD_LENGTH}
+    return vocabulary, BKTree(sorted(vocabulary))
+
+def snap_to_vocabulary(text, model_answer):
+    """Replace words one or two edits away from exactly one model-answer word with that word"""
+    vocabulary, tree = vocabulary_index(model_answer)
+    if not vocabulary:
+        return text
+
+    def replace(match):
+        word = match.group(0)
+        lower = word.lower()
+        if len(lower) < VOCAB_MIN_WORD_LENGTH or lower in vocabulary:
+            return word
+        max_distance = 2 if len(lower) >= 8 else 1
+        matches = tree.search(lower, max_distance)
+        # Only correct when the nearest candidate is unambiguous
+        if not matches or (len(matches) > 1 and matches[0][0] == matches[1][0]):
+            return word
+        best = matches[0][1]
+        return best.capitalize() if word[0].isupper() else best
+
+    return WORD_RE.sub(replace, text)
+
+_rules = None
+
+def get_rules():
+    global _rules
+    if _rules is None:
+        _rules = CorrectionRules(load_corrections())
+    return _rules
+
+def correct_text(student_text, model_answer="", use_vocabulary=OCR_VOCAB_CORRECTION):
+    text = get_rules().apply(student_text)
+    if use_vocabulary and model_answer:
+        text = snap_to_vocabulary(text, model_answer)
+    return text
@@ -0,0 +1,63 @@
+"""Writes of graded results to evaluations.db.
+
+Functions run inside the caller's transaction so bulk grading can write a
+chunk of scripts at once; `record_evaluation` and `delete_student_records`
+wrap a single unit of work in its own transaction. Question results are
+removed by the ON DELETE CASCADE on question_results.evaluation_id. Each
+write bumps data_version once, however many rows it touches.
+"""
+import json
+from datetime import datetime
+
+from database import bump_data_version
+from summaries import apply_evaluation
+
+def save_evaluation(db, evaluation, results):
+    """Replace a student's evaluation for a subject; the caller commits"""
+    db.execute('''INSERT INTO students (roll_no, full_name) VALUES (?, ?)
+        ON CONFLICT(roll_no) DO UPDATE SET full_name = COALESCE(excluded.full_name, students.full_name)''',
+        (evaluation['roll_no'], evaluation['full_name']))
+
+    previous = db.execute('SELECT * FROM evaluations WHERE roll_no = ? AND subject = ?',
+                          (evaluation['roll_no'], evaluation['subject'])).fetchone()
+    if previous is not None:
+        apply_evaluation(db, previous, sign=-1)
+        db.execute('DELETE FROM evaluations WHERE id = ?', (previous['id'],))
+
+    stage_timings = evaluation.get('stage_timings')
+    eval_id = db.execute('''INSERT INTO evaluations (
+        roll_no, subject, timestamp, total_marks, percentage, grade, grade_point,
+        student_pdf_path, model_pdf_path, question_pdf_path, credits, stage_timings, choice_rule)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        (evaluation['roll_no'], evaluation['subject'], datetime.now().isoformat(), evaluation['total_marks'],
+         evaluation['percentage'], evaluation['grade'], evaluation['grade_point'], evaluation['student_pdf'],
+         evaluation['model_pdf'], evaluation['question_pdf'], evaluation['credits'],
+         json.dumps(stage_timings) if stage_timings else None, evaluation.get('choice_rule') or None)).lastrowid
+
+    db.executemany('''INSERT INTO question_results (
+        evaluation_id, question, student_answer, model_answer,
+        similarity, score, max_marks)
+        VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        [(eval_id, result["question"], result["student_answer"],
+          result["model_answer"], result["similarity"],
+          result["score"], result["max_marks"]) for result in results])
+    apply_evaluation(db, evaluation)
+    bump_data_version(db)
+    return eval_id
+
+def record_evaluation(db, evaluation, results):
+    """Save one evaluation and all its question rows as a single transaction"""
+    with db:
+        return save_evaluation(db, evaluation, results)
+
+def delete_student_records(db, roll_no):
+    """Remove a student with their evaluations and question results, in one transaction"""
+    with db:
+        evaluations = db.execute('SELECT * FROM evaluations WHERE roll_no = ?', (roll_no,)).fetchall()
+        for evaluation in evaluations:
+            apply_evaluation(db, evaluation, sign=-1)
+        db.execute('DELETE FROM evaluations WHERE roll_no = ?', (roll_no,))
+        db.execute('DELETE FROM students WHERE roll_no = ?', (roll_no,))
+        if evaluations:
+            bump_data_version(db)
+    return len(evaluations)
@@ -0,0 +1,169 @@
+"""Re-grade a subject from the student answers already stored in question_results.
+
+Use this after a model answer or marks scheme has been corrected. No student
+PDF is read again. For each stored answer:
+
+- if its model answer changed, it is re-encoded against the new one, with
+  model answers going through the embedding cache;
+- if only its marks changed, it is rescored from the stored similarity;
+- otherwise it is left alone.
+
+Totals, grades and the GPA summaries are then updated in one transaction.
+
+    python regrade.py DBMS --model-pdf uploads/dbms_model_v2.pdf
+"""
+import argparse
+import sys
+from collections import defaultdict
+
+from database import bump_data_version
+from evaluator import evaluate_similarity_batch, load_model_answers
+from scoring import apply_scores, build_paper, grade_result, plan_answers
+from summaries import apply_evaluation
+from utils import extract_max_marks
+
+def stored_answers(db, subject):
+    """{evaluation id: {question key: question_results row}} for every evaluation of a subject"""
+    answers = defaultdict(dict)
+    for row in db.execute('''SELECT q.* FROM question_results q
+            JOIN evaluations e ON e.id = q.evaluation_id
+            WHERE e.subject = ? ORDER BY q.id''', (subject,)):
+        answers[row['evaluation_id']][row['question'].removeprefix('Q')] = row
+    return answers
+
+def last_graded_with(db, subject):
+    """Question paper, model answer and choice rule the subject was last graded with"""
+    row = db.execute('''SELECT question_pdf_path, model_pdf_path, choice_rule FROM evaluations
+        WHERE subject = ? ORDER BY timestamp DESC, id DESC LIMIT 1''', (subject,)).fetchone()
+    return (row['question_pdf_path'], row['model_pdf_path'], row['choice_rule']) if row else (None, None, None)
+
+def regrade_subject(db, subject, max_marks, model_answers, choice_rule=None, question_pdf=None, model_pdf=None):
+    """Rescore every stored evaluation of `subject` against a new marks scheme and/or model answers.
+
+    Only answers whose model answer changed are re-encoded, in one batch
+    across the whole subject. Answers the paper no longer grades are
+    removed. Runs in its own transaction and returns a summary dict.
+    """
+    paper = build_paper(max_marks, model_answers, choice_rule)
+    evaluations = db.execute('SELECT * FROM evaluations WHERE subject = ? ORDER BY roll_no', (subject,)).fetchall()
+    answers = stored_answers(db, subject)
+
+    plans = []
+    pairs = []
+    for evaluation in evaluations:
+        stored = answers.get(evaluation['id'], {})
+        selected = plan_answers(paper, stored)
+        for item in selected:
+            row = stored[item["key"]]
+            item["student_answer"] = row['student_answer'] or ""
+            item["model_answer"] = model_answers.get(item["key"], "")
+            if item["model_answer"] != row['model_answer'] or row['similarity'] is None:
+                item["pair"] = len(pairs)
+                pairs.append((item["student_answer"], item["model_answer"]))
+        plans.append((evaluation, stored, selected))
+    new_similarities = evaluate_similarity_batch(pairs)
+
+    question_updates = []
+    question_deletes = []
+    evaluation_updates = []
+    students = []
+    rescaled = 0
+    with db:
+        changes_before = db.total_changes
+        for evaluation, stored, selected in plans:
+            similarities = [new_similarities[item["pair"]] if "pair" in item else stored[item["key"]]['similarity']
+                            for item in selected]
+            results, total_marks = apply_scores(selected, similarities)
+            for item, result in zip(selected, results):
+                row = stored[item["key"]]
+                if "pair" in item or result["score"] != row['score'] or result["max_marks"] != row['max_marks']:
+                    rescaled += "pair" not in item
+                    question_updates.append((result["model_answer"], result["similarity"], result["score"],
+                                             result["max_marks"], row['id']))
+            graded = {item["key"] for item in selected}
+            question_deletes.extend((row['id'],) for key, row in stored.items() if key not in graded)
+
+            percentage, grade, grade_point = grade_result(total_marks, max_marks, choice_rule)
+            students.append({
+                "roll_no": evaluation['roll_no'],
+                "previous_total_marks": evaluation['total_marks'],
+                "total_marks": total_marks,
+                "percentage": round(percentage, 2),
+                "grade": grade,
+                "grade_point": grade_point
+            })
+            # A new marks scheme can move the percentage without changing the grade
+            if (total_marks, percentage, grade, grade_point) == (evaluation['total_marks'], evaluation['percentage'],
+                                                                 evaluation['grade'], evaluation['grade_point']):
+                continue
+            # Move the evaluation's contribution to the summaries from its old grade to the new one
+            apply_evaluation(db, evaluation, sign=-1)
+            apply_evaluation(db, dict(evaluation, percentage=percentage, grade_point=grade_point))
+            evaluation_updates.append((total_marks, percentage, grade, grade_point, evaluation['id']))
+
+        db.executemany('''UPDATE question_results SET model_answer = ?, similarity = ?, score = ?, max_marks = ?
+            WHERE id = ?''', question_updates)
+        db.executemany('DELETE FROM question_results WHERE id = ?', question_deletes)
+        db.executemany('''UPDATE evaluations SET total_marks = ?, percentage = ?, grade = ?, grade_point = ?
+            WHERE id = ?''', evaluation_updates)
+        db.execute('UPDATE evaluations SET choice_rule = ? WHERE subject = ? AND choice_rule IS NOT ?',
+                   (choice_rule or None, subject, choice_rule or None))
+        if question_pdf or model_pdf:
+            db.execute('''UPDATE evaluations SET question_pdf_path = COALESCE(?, question_pdf_path),
+                model_pdf_path = COALESCE(?, model_pdf_path) WHERE subject = ?''', (question_pdf, model_pdf, subject))
+        if db.total_changes > changes_before:
+            bump_data_version(db)
+
+    return {
+        "subject": subject,
+        "evaluations": len(evaluations),
+        "regraded": len(evaluation_updates),
+        "reencoded_answers": len(pairs),
+        "rescaled_answers": rescaled,
+        "removed_answers": len(question_deletes),
+        "students": students
+    }
+
+def regrade_from_pdfs(db, subject, question_pdf=None, model_pdf=None, choice_rule=None):
+    """Read the new question paper and/or model answer, defaulting to the ones last used, and re-grade.
+
+    A blank choice rule keeps the rule the subject was last graded with.
+    """
+    last_question_pdf, last_model_pdf, last_choice_rule = last_graded_with(db, subject)
+    choice_rule = choice_rule or last_choice_rule
+    if not (question_pdf or last_question_pdf) or not (model_pdf or last_model_pdf):
+        raise ValueError(f"No graded evaluations of {subject!r} to re-grade")
+
+    max_marks = extract_max_marks(question_pdf or last_question_pdf)
+    if not max_marks:
+        raise ValueError("Could not extract marks from question paper!")
+    model_answers = load_model_answers(model_pdf or last_model_pdf)
+    # Only newly supplied files replace the paths stored with each evaluation
+    return regrade_subject(db, subject, max_marks, model_answers, choice_rule, question_pdf, model_pdf)
+
+def main():
+    from database import DATABASE, connect
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("subject")
+    parser.add_argument("--question-pdf", help="new question paper; defaults to the one last used")
+    parser.add_argument("--model-pdf", help="new model answer; defaults to the one last used")
+    parser.add_argument("--choice-rule", default="", help="defaults to the rule the subject was last graded with")
+    parser.add_argument("--database", default=DATABASE)
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    try:
+        summary = regrade_from_pdfs(conn, args.subject, args.question_pdf, args.model_pdf, args.choice_rule)
+    except ValueError as e:
+        print(e)
+        return 1
+    finally:
+        conn.close()
+    for student in summary.pop("students"):
+        print(f"{student['roll_no']}: {student['previous_total_marks']} -> {student['total_marks']} ({student['grade']})")
+    print(summary)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import base64
+import json
+import os
+
+# Rows per page on the reports screen
+REPORT_PAGE_SIZE = int(os.environ.get("REPORT_PAGE_SIZE", "50"))
+
+# Sort keys accepted for the evaluation history -> column they order by
+HISTORY_SORTS = {
+    "date": "e.timestamp",
+    "roll_no": "e.roll_no",
+    "subject": "e.subject",
+    "marks": "e.total_marks",
+    "grade_point": "e.grade_point",
+}
+
+def encode_cursor(values):
+    """Opaque page token holding the sort key of the last row shown"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor, size):
+    """Sort key from a page token: a list of `size` strings, numbers or nulls"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise ValueError("Invalid page cursor")
+    if (not isinstance(values, list) or len(values) != size
+            or not all(value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool))
+                       for value in values)):
+        raise ValueError("Invalid page cursor")
+    return values
+
+def evaluation_filters(subject=None, department=None, date_from=None, date_to=None):
+    """WHERE clauses and parameters shared by the history and subject statistics"""
+    clauses, params = [], []
+    if subject:
+        clauses.append("e.subject = ?")
+        params.append(subject)
+    if department:
+        clauses.append("s.department = ?")
+        params.append(department)
+    if date_from:
+        clauses.append("e.timestamp >= ?")
+        params.append(date_from)
+    if date_to:
+        # Dates are inclusive; timestamps are ISO strings so compare against the next day
+        clauses.append("e.timestamp < date(?, '+1 day')")
+        params.append(date_to)
+    return clauses, params
+
+def student_gpas(db, department=None, after=None, limit=REPORT_PAGE_SIZE):
+    """One page of students in roll-number order with their materialized GPA.
+
+    Returns (rows, cursor for the next page or None).
+    """
+    clauses, params = [], []
+    if department:
+        clauses.append("s.department = ?")
+        params.append(department)
+    if after:
+        if not isinstance(after[0], str):
+            raise ValueError("Invalid page cursor")
+        clauses.append("g.roll_no > ?")
+        params.append(after[0])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = db.execute(f'''
+        SELECT g.roll_no, s.full_name, s.department, g.gpa, g.subjects as exams_taken
+        FROM student_summary g
+        LEFT JOIN students s ON g.roll_no = s.roll_no
+        {where}
+        ORDER BY g.roll_no
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+    next_cursor = encode_cursor([rows[limit - 1]['roll_no']]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def evaluation_history(db, filters=None, sort="date", descending=True, after=None, limit=REPORT_PAGE_SIZE):
+    """One page of evaluations, keyset paginated on (sort column, id).
+
+    SQLite sorts NULLs first ascending and last descending, and a row
+    comparison against NULL is never true, so rows with no sort value are
+    paged with their own conditions. Returns (rows, cursor for the next
+    page or None).
+    """
+    if sort not in HISTORY_SORTS:
+        raise ValueError(f"Unknown sort {sort!r}; choose one of {', '.join(HISTORY_SORTS)}")
+    column = HISTORY_SORTS[sort]
+    direction = "DESC" if descending else "ASC"
+    clauses, params = evaluation_filters(**(filters or {}))
+    if after:
+        value, last_id = after
+        if not isinstance(last_id, int) or isinstance(last_id, bool):
+            raise ValueError("Invalid page cursor")
+        if value is None and descending:
+            clauses.append(f"({column} IS NULL AND e.id < ?)")
+            params.append(last_id)
+        elif value is None:
+            clauses.append(f"({column} IS NOT NULL OR e.id > ?)")
+            params.append(last_id)
+        elif descending:
+            clauses.append(f"(({column}, e.id) < (?, ?) OR {column} IS NULL)")
+            params.extend([value, last_id])
+        else:
+            clauses.append(f"({column}, e.id) > (?, ?)")
+            params.extend([value, last_id])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = db.execute(f'''
+        SELECT e.*, strftime('%d/%m/%Y %H:%M', e.timestamp) as formatted_date, s.full_name, s.department,
+            {column} as sort_value
+        FROM evaluations e
+        LEFT JOIN students s ON e.roll_no = s.roll_no
+        {where}
+        ORDER BY {column} {direction}, e.id {direction}
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor([last['sort_value'], last['id']])
+    return rows[:limit], next_cursor
+
+def subject_stats(db, filters=None):
+    """Per-subject averages; unfiltered reads come straight from the materialized summary"""
+    if not any((filters or {}).values()):
+        return db.execute('''SELECT subject, avg_percentage, exams_graded, avg_grade_point, credits
+            FROM subject_summary ORDER BY subject''').fetchall()
+    clauses, params = evaluation_filters(**(filters or {}))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    # Joining students for every row doubles the cost, so only do it to filter by department
+    join = "LEFT JOIN students s ON e.roll_no = s.roll_no" if (filters or {}).get("department") else ""
+    return db.execute(f'''
+        SELECT e.subject,
+            AVG(e.percentage) as avg_percentage,
+            COUNT(*) as exams_graded,
+            AVG(e.grade_point) as avg_grade_point,
+            e.credits
+        FROM evaluations e
+        {join}
+        {where}
+        GROUP BY e.subject
+    ''', params).fetchall()
+
+def report_options(db):
+    """Subjects and departments for the report filter drop-downs"""
+    subjects = [row[0] for row in db.execute('SELECT subject FROM subject_summary ORDER BY subject')]
+    departments = [row[0] for row in db.execute(
+        'SELECT DISTINCT department FROM students WHERE department IS NOT NULL ORDER BY department')]
+    return subjects, departments
@@ -0,0 +1,139 @@
+import re
+
+# Marks assumed for a sub-question the question paper didn't list
+DEFAULT_MAX_MARKS = 7
+
+QUESTION_KEY_RE = re.compile(r'^(\d+)([a-zA-Z]*)$')
+CHOICE_ANY_RE = re.compile(r'^any\s+(\d+)\s+of\s+(.+)$', re.IGNORECASE)
+CHOICE_RANGE_RE = re.compile(r'^(\d+)\s*-\s*(\d+)$')
+
+def split_key(key):
+    """'12b' -> ('12', 'b'); keys that aren't question numbers give (None, None)"""
+    match = QUESTION_KEY_RE.match(key)
+    if not match:
+        return None, None
+    return match.group(1), match.group(2).lower()
+
+def parse_choice_rule(rule):
+    """Parse a choice rule into units of {"questions": [...], "choose": n}.
+
+    Groups are comma separated. Each group is either alternatives such as
+    '1/2' (answer one) or 'any N of ...' over a range ('1-8') or
+    alternatives ('1/3/5'). Example: '1/2, 3/4, any 2 of 5-8'.
+    """
+    units = []
+    for group in filter(None, (g.strip() for g in (rule or "").split(','))):
+        choose = 1
+        any_match = CHOICE_ANY_RE.match(group)
+        if any_match:
+            choose = int(any_match.group(1))
+            group = any_match.group(2).strip()
+
+        range_match = CHOICE_RANGE_RE.match(group)
+        if range_match:
+            questions = [str(n) for n in range(int(range_match.group(1)), int(range_match.group(2)) + 1)]
+        else:
+            questions = [q.strip() for q in group.split('/') if q.strip()]
+        if not questions or not all(q.isdigit() for q in questions):
+            raise ValueError(f"Could not understand choice rule group {group!r}")
+        units.append({"questions": questions, "choose": min(choose, len(questions))})
+    return units
+
+def build_paper(max_marks, model_answers, choice_rule=None):
+    """Declarative paper structure: units of questions, each question with its sub-parts.
+
+    Questions are those in the model answers, with sub-parts from both the
+    model answers and the marks scheme. Without a choice rule every
+    question is its own unit and all answered parts are graded. With one,
+    each unit grades at most `choose` of its questions.
+    """
+    questions = {}
+    answered_numbers = {split_key(key)[0] for key in model_answers}
+    for key in list(model_answers) + list(max_marks):
+        number, part = split_key(key)
+        if number is None:
+            continue
+        parts = questions.setdefault(number, {})
+        parts.setdefault(key, max_marks.get(key, DEFAULT_MAX_MARKS))
+
+    def question(number):
+        return {"number": number, "parts": sorted(questions.get(number, {}).items(), key=lambda p: split_key(p[0])[1])}
+
+    units = []
+    claimed = set()
+    for unit in parse_choice_rule(choice_rule):
+        units.append({"questions": [question(n) for n in unit["questions"]], "choose": unit["choose"]})
+        claimed.update(unit["questions"])
+    for number in sorted(questions, key=int):
+        if number not in claimed and number in answered_numbers:
+            units.append({"questions": [question(number)], "choose": None})
+    return units
+
+def paper_max_marks(paper):
+    """Best attainable total: each unit counts its `choose` highest-valued questions"""
+    total = 0
+    for unit in paper:
+        question_totals = sorted((sum(marks for _, marks in q["parts"]) for q in unit["questions"]), reverse=True)
+        total += sum(question_totals[:unit["choose"]] if unit["choose"] else question_totals)
+    return total
+
+def plan_answers(paper, student_answers):
+    """Pick which answers to grade: answered parts of the first `choose` answered questions per unit"""
+    selected = []
+    for unit in paper:
+        answered = [q for q in unit["questions"] if any(key in student_answers for key, _ in q["parts"])]
+        if unit["choose"]:
+            answered = answered[:unit["choose"]]
+        for q in answered:
+            for key, marks in q["parts"]:
+                if key in student_answers:
+                    selected.append({"key": key, "max_marks": marks})
+    return selected
+
+def apply_scores(selected, similarities):
+    """Turn similarities into marks for every selected answer.
+
+    Each score is rounded with Python's round(), as the per-pair path did;
+    np.round rounds some half-way values the other way.
+    """
+    results = []
+    total_marks = 0
+    for item, similarity in zip(selected, similarities):
+        similarity = float(similarity)
+        score = round((similarity / 100) * item["max_marks"], 2)
+        total_marks += score
+        results.append({
+            "question": f"Q{item['key']}",
+            "max_marks": item["max_marks"],
+            "score": score,
+            "similarity": similarity,
+            "student_answer": item["student_answer"],
+            "model_answer": item["model_answer"]
+        })
+    return results, round(total_marks, 2)
+
+def calculate_grade(percentage):
+    if percentage >= 90:
+        return 'O', 10.0
+    elif percentage >= 80:
+        return 'A+', 9.0
+    elif percentage >= 70:
+        return 'A', 8.0
+    elif percentage >= 60:
+        return 'B+', 7.0
+    elif percentage >= 50:
+        return 'B', 6.0
+    elif percentage >= 40:
+        return 'C', 5.0
+    else:
+        return 'F', 0.0
+
+def grade_result(total_marks, max_marks, choice_rule=None):
+    """Percentage, grade and grade point for a script's total marks"""
+    if choice_rule:
+        total_max_marks = paper_max_marks(build_paper(max_marks, max_marks, choice_rule))
+    else:
+        total_max_marks = sum(max_marks.values())/2
+    percentage = (total_marks / total_max_marks * 100) if total_max_marks else 0
+    grade, grade_point = calculate_grade(percentage)
+    return percentage, grade, grade_point
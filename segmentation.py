@@ -0,0 +1,100 @@
+"""Split OCR text into answers with one pass of a compiled scanner.
+
+The scanner finds, anywhere in the text:
+
+- page breaks (PAGE_BREAK, which the PDF and OCR readers put between pages)
+- page markers such as "Page 3" or "Page 3 of 12", which are left out of answers
+- unit headers such as "Unit I" or "UNIT - 2: Trees", which are also left out;
+  a header is a line of just the unit or the unit and a short title after
+  ":" or "-", so a sentence like "Unit 2 covers trees" stays in the answer
+- answer headings: "1)", "1a)", "1.a", "1. a)", "Q1(a)", "Q.2", "Question 3:", "Ans 4b"
+
+Everything between one answer heading and the next belongs to that answer,
+across page breaks, page markers and unit headers. Lines starting "a)" or
+"(b)" are lists inside the answer, not headings. A question number written again later,
+e.g. "Q3 (contd.)", adds to the earlier answer instead of replacing it.
+Answers are returned as character offsets into the text; only
+answer_texts copies strings out.
+"""
+import re
+from itertools import chain
+
+PAGE_BREAK = "\n\f"
+
+# A heading at the start of a line; `$` and `\b` rely on MULTILINE and IGNORECASE
+HEADING = r"""
+    (?P<marker>page[ \t]*\d+(?:[ \t]*(?:of|/)[ \t]*\d+)?)[ \t\r]*$
+  | unit[ \t]*[-:.]?[ \t]*(?P<unit>[ivxl]+|\d+)(?:[ \t]*[:-][^\n\f]{0,60}|[ \t]*\.?)[ \t\r]*$
+  | (?P<prefix>(?:q(?:uestion|n)?|ans(?:wer)?)\.?[ \t]*(?:no\.?[ \t]*)?)?
+    (?P<number>\d{1,3})
+    (?P<sub>
+        (?P<attached>[a-z])(?![a-z])
+      | [.)](?P<dotted>[a-z])(?![a-z])
+      | [ \t]*[.)]?[ \t]*\((?P<bracketed>[a-z])\)
+      | [ \t]*[.)]?[ \t]*(?P<closed>[a-z])\)
+    )?
+    (?:
+        [ \t]*[.):-](?!\d)[.):\- \t]*
+      | [ \t]+(?=\S)
+      | (?(prefix)[ \t\r]*$|(?!))
+      | (?(sub)[ \t\r]*$|(?!))
+    )
+"""
+FLAGS = re.IGNORECASE | re.MULTILINE | re.VERBOSE
+# Headings follow a newline and page breaks start with one, so the scanner has a
+# literal first character and the regex engine skips quickly between lines
+SCANNER_RE = re.compile(rf"\n (?: \f?[ \t]*(?:{HEADING}) | \f )", FLAGS)
+# The first line has no newline in front of it
+FIRST_LINE_RE = re.compile(rf"[ \t]*(?:{HEADING})", FLAGS)
+
+def segment(text):
+    """Scan text once; returns [(key, start, end, page, unit)] in text order.
+
+    A key's answer is every segment with that key. Segments are split at
+    page breaks and page markers, so one answer can have several. `page`
+    counts from 1 and `unit` is the latest unit header, or None.
+    """
+    segments = []
+    key = None
+    # A heading gets a segment even when nothing is written under it, so the question still counts as answered
+    opened = False
+    start = 0
+    page = 1
+    unit = None
+    first = FIRST_LINE_RE.match(text)
+    for match in chain([first] if first else [], SCANNER_RE.finditer(text)):
+        position, end = match.span()
+        page_break = text.startswith(PAGE_BREAK, position)
+        unit_label, number, attached, dotted, bracketed, closed = match.group(
+            "unit", "number", "attached", "dotted", "bracketed", "closed")
+        if key is not None and (opened or position > start):
+            segments.append((key, start, position, page, unit))
+        opened = False
+        start = end
+        if page_break:
+            page += 1
+        if unit_label:
+            # The unit header line is dropped; text under it still belongs to the current answer
+            unit = unit_label.upper()
+        elif number:
+            part = attached or dotted or bracketed or closed or ""
+            key = str(int(number)) + part.lower()
+            opened = True
+    if key is not None and (opened or len(text) > start):
+        segments.append((key, start, len(text), page, unit))
+    return segments
+
+def answer_spans(segments):
+    """{key: [(start, end), ...]} in order of first appearance"""
+    spans = {}
+    for key, start, end, _, _ in segments:
+        spans.setdefault(key, []).append((start, end))
+    return spans
+
+def answer_texts(text, segments):
+    """{key: answer} with each answer's lines stripped and joined by single spaces"""
+    answers = {}
+    for key, spans in answer_spans(segments).items():
+        lines = "\n".join([text[start:end] for start, end in spans]).split("\n")
+        answers[key] = " ".join(filter(None, map(str.strip, lines)))
+    return answers
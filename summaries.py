@@ -0,0 +1,164 @@
+"""Materialized per-student GPA and per-subject statistics.
+
+Both tables hold running sums that are adjusted by each evaluation written
+or removed, so report pages read precomputed rows instead of re-aggregating
+evaluations. Rebuild or check them from the command line:
+
+    python summaries.py rebuild
+    python summaries.py check
+"""
+import argparse
+import sqlite3
+import sys
+
+# Floating-point running sums may drift this far from a fresh aggregate
+CHECK_TOLERANCE = 1e-6
+
+def create_summary_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS student_summary (
+        roll_no TEXT PRIMARY KEY,
+        subjects INTEGER NOT NULL DEFAULT 0,
+        total_credits REAL NOT NULL DEFAULT 0,
+        weighted_points REAL NOT NULL DEFAULT 0,
+        failed_subjects INTEGER NOT NULL DEFAULT 0,
+        gpa REAL NOT NULL DEFAULT 0)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS subject_summary (
+        subject TEXT PRIMARY KEY,
+        exams_graded INTEGER NOT NULL DEFAULT 0,
+        total_percentage REAL NOT NULL DEFAULT 0,
+        total_grade_point REAL NOT NULL DEFAULT 0,
+        avg_percentage REAL NOT NULL DEFAULT 0,
+        avg_grade_point REAL NOT NULL DEFAULT 0,
+        credits INTEGER)''')
+
+# Derived columns, recomputed from the running sums after every change.
+# Semester GPA is credit weighted and 0.0 as soon as any subject is failed.
+STUDENT_GPA_SQL = '''CASE WHEN failed_subjects > 0 THEN 0.0
+    WHEN total_credits > 0 THEN weighted_points / total_credits ELSE 0.0 END'''
+
+def apply_evaluation(conn, evaluation, sign=1):
+    """Add (sign=1) or remove (sign=-1) one evaluation row's contribution to both summaries"""
+    credits = evaluation['credits'] or 0
+    grade_point = evaluation['grade_point'] or 0.0
+    percentage = evaluation['percentage'] or 0.0
+
+    conn.execute('''INSERT INTO student_summary (roll_no, subjects, total_credits, weighted_points, failed_subjects)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(roll_no) DO UPDATE SET
+            subjects = subjects + excluded.subjects,
+            total_credits = total_credits + excluded.total_credits,
+            weighted_points = weighted_points + excluded.weighted_points,
+            failed_subjects = failed_subjects + excluded.failed_subjects''',
+        (evaluation['roll_no'], sign, sign * credits, sign * grade_point * credits, sign * (grade_point == 0.0)))
+    conn.execute(f'UPDATE student_summary SET gpa = {STUDENT_GPA_SQL} WHERE roll_no = ?', (evaluation['roll_no'],))
+    conn.execute('DELETE FROM student_summary WHERE roll_no = ? AND subjects <= 0', (evaluation['roll_no'],))
+
+    conn.execute('''INSERT INTO subject_summary (subject, exams_graded, total_percentage, total_grade_point, credits)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(subject) DO UPDATE SET
+            exams_graded = exams_graded + excluded.exams_graded,
+            total_percentage = total_percentage + excluded.total_percentage,
+            total_grade_point = total_grade_point + excluded.total_grade_point,
+            credits = COALESCE(excluded.credits, credits)''',
+        (evaluation['subject'], sign, sign * percentage, sign * grade_point, credits if sign > 0 else None))
+    conn.execute('''UPDATE subject_summary SET
+            avg_percentage = CASE WHEN exams_graded > 0 THEN total_percentage / exams_graded ELSE 0.0 END,
+            avg_grade_point = CASE WHEN exams_graded > 0 THEN total_grade_point / exams_graded ELSE 0.0 END
+        WHERE subject = ?''', (evaluation['subject'],))
+    conn.execute('DELETE FROM subject_summary WHERE subject = ? AND exams_graded <= 0', (evaluation['subject'],))
+
+def rebuild_summaries(conn):
+    """Recompute both tables from the evaluations; the caller commits"""
+    create_summary_tables(conn)
+    conn.execute('DELETE FROM student_summary')
+    conn.execute('DELETE FROM subject_summary')
+    conn.execute('''INSERT INTO student_summary (roll_no, subjects, total_credits, weighted_points, failed_subjects)
+        SELECT roll_no, COUNT(*), SUM(COALESCE(credits, 0)),
+            SUM(COALESCE(grade_point, 0.0) * COALESCE(credits, 0)),
+            SUM(COALESCE(grade_point, 0.0) = 0.0)
+        FROM evaluations
+        GROUP BY roll_no''')
+    conn.execute(f'UPDATE student_summary SET gpa = {STUDENT_GPA_SQL}')
+    # Subject credits come from the most recent evaluation of the subject
+    conn.execute('''INSERT INTO subject_summary (subject, exams_graded, total_percentage, total_grade_point,
+            avg_percentage, avg_grade_point, credits)
+        SELECT e.subject, COUNT(*), SUM(COALESCE(e.percentage, 0.0)), SUM(COALESCE(e.grade_point, 0.0)),
+            AVG(COALESCE(e.percentage, 0.0)), AVG(COALESCE(e.grade_point, 0.0)),
+            (SELECT credits FROM evaluations latest WHERE latest.subject = e.subject
+             ORDER BY latest.timestamp DESC, latest.id DESC LIMIT 1)
+        FROM evaluations e
+        GROUP BY e.subject''')
+
+def check_summaries(conn):
+    """Rows whose stored summary differs from a fresh aggregate, as a list of dicts"""
+    mismatches = []
+    students = conn.execute(f'''
+        SELECT fresh.roll_no, fresh.subjects, fresh.gpa, stored.subjects as stored_subjects, stored.gpa as stored_gpa
+        FROM (SELECT roll_no, COUNT(*) as subjects,
+                CASE WHEN SUM(COALESCE(grade_point, 0.0) = 0.0) > 0 THEN 0.0
+                     WHEN SUM(COALESCE(credits, 0)) > 0
+                     THEN SUM(COALESCE(grade_point, 0.0) * COALESCE(credits, 0)) / SUM(COALESCE(credits, 0))
+                     ELSE 0.0 END as gpa
+              FROM evaluations GROUP BY roll_no) fresh
+        LEFT JOIN student_summary stored ON stored.roll_no = fresh.roll_no
+        UNION ALL
+        SELECT stored.roll_no, NULL, NULL, stored.subjects, stored.gpa
+        FROM student_summary stored
+        WHERE NOT EXISTS (SELECT 1 FROM evaluations e WHERE e.roll_no = stored.roll_no)''').fetchall()
+    for row in students:
+        if (row['subjects'] != row['stored_subjects'] or row['gpa'] is None or row['stored_gpa'] is None
+                or abs(row['gpa'] - row['stored_gpa']) > CHECK_TOLERANCE):
+            mismatches.append({"table": "student_summary", "key": row['roll_no'],
+                               "expected": {"subjects": row['subjects'], "gpa": row['gpa']},
+                               "stored": {"subjects": row['stored_subjects'], "gpa": row['stored_gpa']}})
+
+    subjects = conn.execute('''
+        SELECT fresh.subject, fresh.exams_graded, fresh.avg_percentage, fresh.avg_grade_point,
+            stored.exams_graded as stored_exams_graded, stored.avg_percentage as stored_avg_percentage,
+            stored.avg_grade_point as stored_avg_grade_point
+        FROM (SELECT subject, COUNT(*) as exams_graded, AVG(COALESCE(percentage, 0.0)) as avg_percentage,
+                AVG(COALESCE(grade_point, 0.0)) as avg_grade_point
+              FROM evaluations GROUP BY subject) fresh
+        LEFT JOIN subject_summary stored ON stored.subject = fresh.subject
+        UNION ALL
+        SELECT stored.subject, NULL, NULL, NULL, stored.exams_graded, stored.avg_percentage, stored.avg_grade_point
+        FROM subject_summary stored
+        WHERE NOT EXISTS (SELECT 1 FROM evaluations e WHERE e.subject = stored.subject)''').fetchall()
+    for row in subjects:
+        expected = (row['exams_graded'], row['avg_percentage'], row['avg_grade_point'])
+        stored = (row['stored_exams_graded'], row['stored_avg_percentage'], row['stored_avg_grade_point'])
+        if None in expected or None in stored or expected[0] != stored[0] or any(
+                abs(a - b) > CHECK_TOLERANCE for a, b in zip(expected[1:], stored[1:])):
+            mismatches.append({"table": "subject_summary", "key": row['subject'],
+                               "expected": dict(zip(("exams_graded", "avg_percentage", "avg_grade_point"), expected)),
+                               "stored": dict(zip(("exams_graded", "avg_percentage", "avg_grade_point"), stored))})
+    return mismatches
+
+def main():
+    from database import DATABASE, connect
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--database", default=DATABASE)
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    try:
+        if args.command == "rebuild":
+            with conn:
+                rebuild_summaries(conn)
+            print("Summaries rebuilt.")
+            return 0
+        mismatches = check_summaries(conn)
+        for mismatch in mismatches:
+            print(mismatch)
+        print(f"{len(mismatches)} summary rows out of date" if mismatches else "Summaries are consistent.")
+        return 1 if mismatches else 0
+    except sqlite3.OperationalError as e:
+        print(f"Could not read summaries: {e}")
+        return 1
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,76 +1,227 @@
 import fitz
 import re
 import pytesseract
-import PyPDF2
-from pdf2image import convert_from_path
 import google.generativeai as genai
 from PIL import Image
 import io
+import os
+import time
+import multiprocessing
+import threading
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from cache import OCRCache
+from document import load_document, render_page
+from gemini_client import GeminiClient
+from metrics import ocr_page_seconds, span
+from preprocess import OCR_PREPROCESS, parse_steps, preprocess_image, signature
+from segmentation import PAGE_BREAK, answer_texts, segment
+
+# Rasterization resolution used for OCR; part of the OCR cache key
+OCR_DPI = int(os.environ.get("OCR_DPI", "200"))
+# Render Tesseract pages as 8-bit grayscale: a third of the memory of RGB, same OCR input.
+# Handwritten pages go to Gemini in colour, as they always have.
+OCR_GRAYSCALE = os.environ.get("OCR_GRAYSCALE", "1") == "1"
+
+# Pages with at least this much extractable text are read directly instead of OCR'd
+TEXT_LAYER_MIN_CHARS = int(os.environ.get("TEXT_LAYER_MIN_CHARS", "20"))
+
+# Page clean-up before Tesseract (see preprocess.py), and extra Tesseract options such as "--psm 4"
+OCR_PREPROCESS_STEPS = parse_steps(OCR_PREPROCESS)
+TESSERACT_CONFIG = os.environ.get("TESSERACT_CONFIG", "")
+
+# Tesseract pages run in this many processes; Gemini pages on this many threads
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", str(os.cpu_count() or 1)))
+GEMINI_CONCURRENCY = int(os.environ.get("GEMINI_CONCURRENCY", "4"))
+
+# Question-number patterns, compiled once
+FULL_QUESTION_RE = re.compile(r'^(\d+)\.\s*([a-zA-Z])\)')
+MAIN_QUESTION_RE = re.compile(r'^(\d+)\.')
+SUB_QUESTION_RE = re.compile(r'^([a-zA-Z])\)')
+MARKS_RE = re.compile(r'\(?(\d{1,2})M\)?')
+
+# Identical question papers and answer keys are only OCR'd once
+ocr_cache = OCRCache()
+
+# One rate-limited Gemini client shared by every PDF being processed
+gemini_client = GeminiClient(max_concurrency=GEMINI_CONCURRENCY)
+
+# How many pages were read from the text layer vs OCR'd, and the time each took
+page_sources = Counter()
+page_source_seconds = Counter()
+_page_sources_lock = threading.Lock()
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+def get_ocr_pool():
+    """Shared process pool for Tesseract; spawn keeps it safe inside threaded servers"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _ocr_pool
+
+def record_page_sources(sources, page_seconds):
+    with _page_sources_lock:
+        for source, seconds in zip(sources, page_seconds):
+            page_sources[source] += 1
+            page_source_seconds[source] += seconds
+
+def page_source_stats():
+    """Pages per extraction path, and the OCR time the text layer is estimated to have saved"""
+    with _page_sources_lock:
+        counts = dict(page_sources)
+        seconds = dict(page_source_seconds)
+    ocr_pages = counts.get("ocr", 0)
+    avg_ocr_seconds = seconds.get("ocr", 0.0) / ocr_pages if ocr_pages else 0.0
+    return {
+        "text_layer_pages": counts.get("text_layer", 0),
+        "ocr_pages": ocr_pages,
+        "avg_ocr_seconds": round(avg_ocr_seconds, 4),
+        "estimated_seconds_saved": round(counts.get("text_layer", 0) * avg_ocr_seconds, 2)
+    }
+
+def report_ocr_timings(pdf_path, engine, page_seconds, started, sources=None):
+    total = time.perf_counter() - started
+    sources = sources or ["ocr"] * len(page_seconds)
+    for seconds, source in zip(page_seconds, sources):
+        if source == "ocr":
+            ocr_page_seconds.observe(engine, seconds)
+    per_page = ", ".join(f"{seconds:.2f}s{' (text layer)' if source == 'text_layer' else ''}"
+                         for seconds, source in zip(page_seconds, sources))
+    print(f"OCR [{engine}] {os.path.basename(pdf_path)}: {len(page_seconds)} pages in {total:.2f}s (pages: {per_page})")
+
+def ocr_cache_engine(engine, grayscale=OCR_GRAYSCALE, preprocess_steps=()):
+    """Engine label for the OCR cache key; grayscale renders and preprocessing settings are cached separately"""
+    label = f"{engine}-gray" if grayscale else engine
+    if preprocess_steps:
+        label = f"{label}-{signature(preprocess_steps)}"
+    if TESSERACT_CONFIG and engine == "tesseract":
+        label = f"{label}-{TESSERACT_CONFIG}"
+    return label
+
+def tesseract_config(dpi, preprocess_steps):
+    """Tesseract options for a page; only preprocessed pages are told their resolution"""
+    if not preprocess_steps:
+        return TESSERACT_CONFIG
+    return f"--dpi {dpi} {TESSERACT_CONFIG}".strip()
+
+def tesseract_image(image, dpi, preprocess_steps=OCR_PREPROCESS_STEPS):
+    """Clean up one page image and OCR it; with preprocessing off the page goes to Tesseract as it always has"""
+    if preprocess_steps:
+        image, dpi = preprocess_image(image, dpi, preprocess_steps)
+    return pytesseract.image_to_string(image, config=tesseract_config(dpi, preprocess_steps))
+
+def tesseract_page(pdf_path, page_number, dpi, grayscale=OCR_GRAYSCALE):
+    """Rasterize, clean up and OCR one page; runs in a pool process. Returns (text, seconds)"""
+    started = time.perf_counter()
+    with fitz.open(pdf_path) as doc:
+        image = render_page(doc[page_number - 1], dpi, grayscale)
+    text = tesseract_image(image, dpi)
+    return text, time.perf_counter() - started
+
+def ocr_pages_tesseract(doc, dpi=OCR_DPI):
+    """OCR every page with Tesseract across the process pool, in page order.
+
+    Pages that already carry a usable text layer are taken from the parsed
+    document and skip rasterization entirely. Returns [(text, seconds, source)]
+    where source is "text_layer" or "ocr".
+    """
+    pages = {}
+    for index, text in enumerate(doc.page_texts):
+        if len(text.strip()) >= TEXT_LAYER_MIN_CHARS:
+            pages[index + 1] = (text, 0.0, "text_layer")
+
+    page_numbers = [number for number in range(1, doc.page_count + 1) if number not in pages]
+    if OCR_WORKERS > 1 and len(page_numbers) > 1:
+        # Executor.map yields results in submission order, so pages stay ordered
+        ocr_results = get_ocr_pool().map(tesseract_page, [doc.path] * len(page_numbers), page_numbers,
+                                         [dpi] * len(page_numbers))
+    else:
+        ocr_results = (tesseract_page(doc.path, page_number, dpi) for page_number in page_numbers)
+    for page_number, (text, seconds) in zip(page_numbers, ocr_results):
+        pages[page_number] = (text, seconds, "ocr")
+
+    return [pages[number] for number in range(1, doc.page_count + 1)]
 
 # Configure Gemini API (only for student answers)
 genai.configure(api_key="key")  # Replace with your actual API key
 
 def extract_text_from_pdf(pdf_path):
     """Extract text from digital PDF using PyMuPDF"""
-    doc = fitz.open(pdf_path)
-    return "\n".join([page.get_text("text") for page in doc]).strip()
+    return load_document(pdf_path).text.strip()
 
+def gemini_page(page_number, img):
+    """OCR one page with Gemini, falling back to pytesseract. Returns (text, seconds, fell_back)"""
+    started = time.perf_counter()
+    try:
+        # Use PIL Image directly with Gemini
+        text = gemini_client.generate([
+            "Extract all text from this handwritten answer sheet exactly as written, including question numbers:",
+            img  # Pass the PIL Image directly
+        ])
+        return text, time.perf_counter() - started, False
+    except Exception as e:
+        print(f"Error processing image with Gemini: {e}")
+        # Fallback to pytesseract if Gemini fails
+        gemini_client.record_fallback(page_number)
+        return pytesseract.image_to_string(img), time.perf_counter() - started, True
+
+@span("ocr_handwritten")
 def extract_text_from_handwritten_pdf(pdf_path):
     """Extract text from scanned/handwritten PDF using Gemini"""
-    images = convert_from_path(pdf_path)
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    extracted_text = []
-    
-    for img in images:
-        try:
-            # Use PIL Image directly with Gemini
-            response = model.generate_content([
-                "Extract all text from this handwritten answer sheet exactly as written, including question numbers:",
-                img  # Pass the PIL Image directly
-            ])
-            extracted_text.append(response.text)
-        except Exception as e:
-            print(f"Error processing image with Gemini: {e}")
-            # Fallback to pytesseract if Gemini fails
-            extracted_text.append(pytesseract.image_to_string(img))
-    
-    return "\n".join(extracted_text).strip()
+    doc = load_document(pdf_path)
+    digest = doc.digest
+    engine = ocr_cache_engine("gemini", grayscale=False)
+    cached = ocr_cache.get(digest, engine, OCR_DPI)
+    if cached is not None:
+        return PAGE_BREAK.join(cached).strip()
+
+    started = time.perf_counter()
+    pages = []
+    with ThreadPoolExecutor(max_workers=GEMINI_CONCURRENCY) as executor:
+        # Pages are rendered as the pool drains, bounding how many images are alive at once
+        in_flight = deque()
+        for page_number, img in doc.iter_page_images(OCR_DPI, grayscale=False):
+            in_flight.append(executor.submit(gemini_page, page_number, img))
+            if len(in_flight) >= 2 * GEMINI_CONCURRENCY:
+                pages.append(in_flight.popleft().result())
+        pages.extend(future.result() for future in in_flight)
+    report_ocr_timings(pdf_path, "gemini", [seconds for _, seconds, _ in pages], started)
 
+    extracted_text = [text for text, _, _ in pages]
+    # Don't pin a degraded Tesseract fallback in the cache
+    if not any(fell_back for _, _, fell_back in pages):
+        ocr_cache.put(digest, engine, OCR_DPI, extracted_text)
+    return PAGE_BREAK.join(extracted_text).strip()
+
+@span("ocr_scanned")
 def extract_text_from_scanned_pdf(pdf_path):
     """Extract text from scanned PDF (for question paper and model answers) using pytesseract"""
-    images = convert_from_path(pdf_path)
-    text = ""
-    for img in images:
-        text += pytesseract.image_to_string(img) + "\n"
-    return text.strip()
+    doc = load_document(pdf_path)
+    digest = doc.digest
+    engine = ocr_cache_engine("tesseract", preprocess_steps=OCR_PREPROCESS_STEPS)
+    pages = ocr_cache.get(digest, engine, OCR_DPI)
+    if pages is None:
+        started = time.perf_counter()
+        results = ocr_pages_tesseract(doc)
+        page_seconds = [seconds for _, seconds, _ in results]
+        sources = [source for _, _, source in results]
+        record_page_sources(sources, page_seconds)
+        report_ocr_timings(pdf_path, "tesseract", page_seconds, started, sources)
+        pages = [text for text, _, _ in results]
+        ocr_cache.put(digest, engine, OCR_DPI, pages)
+    return PAGE_BREAK.join(pages).strip()
 
+@span("segmentation")
 def extract_answers(text):
-    """Extract answers with flexible question number parsing"""
-    answers = {}
-    current_q = None
-    current_ans = []
-    
-    for line in text.split('\n'):
-        line = line.strip()
-        if not line:
-            continue
-        
-        match = re.match(r"^(?:Q(?:uestion\s*)?)?(\d+[a-zA-Z]*)[\s.):-]+\s*(.*)", line, re.IGNORECASE)
-        if match:
-            if current_q:
-                answers[current_q] = ' '.join(current_ans).strip()
-            current_q = match.group(1)
-            current_ans = [match.group(2).strip()]
-        else:
-            current_ans.append(line)
-    
-    if current_q:
-        answers[current_q] = ' '.join(current_ans).strip()
-    
-    return answers
+    """Extract answers with flexible question number parsing (see segmentation.py)"""
+    return answer_texts(text, segment(text))
 
 
 
+@span("marks_extraction")
 def extract_max_marks(pdf_path):
     """
     Extracts question-mark mappings from a PDF file.
@@ -80,23 +231,19 @@ def extract_max_marks(pdf_path):
         dict: {'1a': 10, '1b': 4, '2a': 7, ...}
     """
     try:
-        text = ""
-        with open(pdf_path, "rb") as pdf_file:
-            reader = PyPDF2.PdfReader(pdf_file)
-            for page in reader.pages:
-                text += page.extract_text() or ""
-
-        if not text:
+        lines = load_document(pdf_path).lines
+        if not lines:
             return None
 
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
+        # Each line is scanned for marks once; the "next line" lookup reuses it
+        line_marks = [MARKS_RE.search(line) for line in lines]
         question_marks = {}
         current_question_number = None
         pending_key = None
 
         for i, line in enumerate(lines):
             # Match full: "1. a)"
-            full_match = re.match(r'^(\d+)\.\s*([a-zA-Z])\)', line)
+            full_match = FULL_QUESTION_RE.match(line)
             if full_match:
                 current_question_number = full_match.group(1)
                 sub_part = full_match.group(2).lower()
@@ -104,18 +251,18 @@ def extract_max_marks(pdf_path):
 
             else:
                 # Match just main number like "1."
-                main_match = re.match(r'^(\d+)\.', line)
+                main_match = MAIN_QUESTION_RE.match(line)
                 if main_match:
                     current_question_number = main_match.group(1)
 
                 # Match just sub-question like "a)"
-                subq_match = re.match(r'^([a-zA-Z])\)', line)
+                subq_match = SUB_QUESTION_RE.match(line)
                 if subq_match and current_question_number:
                     sub = subq_match.group(1).lower()
                     pending_key = f"{current_question_number}{sub}"
 
             # Look for marks on same line
-            mark_match = re.search(r'\(?(\d{1,2})M\)?', line)
+            mark_match = line_marks[i]
             if mark_match and pending_key:
                 marks = int(mark_match.group(1))
                 question_marks[pending_key] = marks
@@ -123,8 +270,7 @@ def extract_max_marks(pdf_path):
 
             # Look for marks in the next line
             elif pending_key and i + 1 < len(lines):
-                next_line = lines[i + 1]
-                next_match = re.search(r'\(?(\d{1,2})M\)?', next_line)
+                next_match = line_marks[i + 1]
                 if next_match:
                     marks = int(next_match.group(1))
                     question_marks[pending_key] = marks
@@ -136,14 +282,3 @@ def extract_max_marks(pdf_path):
     except Exception as e:
         print(f"❌ Error during PDF processing: {e}")
         return None
-
-
-
-
-
-
-
-
-
-
-